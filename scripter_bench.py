@@ -0,0 +1,226 @@
+"""
+Benchmarks for sql_scripter, no GUI.
+Times making rows, the script text, checking it and committing it,
+and writes the results to a JSON file so two versions can be compared.
+
+    python scripter_bench.py --output before.json
+    python scripter_bench.py --output after.json --compare before.json
+
+The times are the best of --repeat runs, in seconds per call.
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+
+import scripter_engine as se
+import scripter_functions as sf
+
+ROW_COUNTS = (10, 1_000, 100_000)
+
+CREATE_SONG_TABLE = (
+    "CREATE TABLE catalog_song ("
+    "id INTEGER PRIMARY KEY, song_title TEXT NOT NULL, song_number TEXT NOT NULL, "
+    "album_id INTEGER NOT NULL)"
+)
+
+
+def make_rows(count: int) -> list:
+    """SongRows like a session would make, 12 songs to an album, some with quotes."""
+    return [
+        se.make_song_row(f"Song's title {index}", index % 12 + 1, 1000 + index // 12)
+        for index in range(count)
+    ]
+
+
+def make_database(folder: Path) -> Path:
+    """A new, empty database with just the catalog_song table."""
+    handle, db_path = tempfile.mkstemp(suffix=".sqlite3", dir=folder)
+    # sqlite opens the file itself, an open handle stops the folder being removed on Windows.
+    os.close(handle)
+    db_path = Path(db_path)
+    with sqlite3.connect(db_path) as connection:
+        connection.execute(CREATE_SONG_TABLE)
+    connection.close()
+    return db_path
+
+
+def time_it(function, repeat: int, setup=None) -> dict:
+    """Time function, best of repeat runs, calling setup before each run untimed.
+
+    Args:
+        function (callable): what to time, called with the result of setup.
+        repeat (int): number of runs.
+        setup (callable, optional): makes what function needs for one run.
+
+    Returns:
+        dict: best, median and mean seconds per call, and the number of runs.
+    """
+    times = []
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start = time.perf_counter()
+        function(argument) if setup else function()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return {
+        "best": times[0],
+        "median": times[len(times) // 2],
+        "mean": sum(times) / len(times),
+        "runs": len(times),
+    }
+
+
+def time_fast(function, repeat: int) -> dict:
+    """Time something quick, like formatting one row, with timeit's loops."""
+    timer = timeit.Timer(function)
+    loops, _ = timer.autorange()
+    times = sorted(total / loops for total in timer.repeat(repeat, loops))
+    return {
+        "best": times[0],
+        "median": times[len(times) // 2],
+        "mean": sum(times) / len(times),
+        "runs": len(times),
+        "loops": loops,
+    }
+
+
+def bench_next_song(repeat: int) -> dict:
+    """A row as made and added by the Next Song button."""
+    results = {}
+    results["make_song_row"] = time_fast(lambda: se.make_song_row("Song's title", 7, 1000, "B"), repeat)
+    row = se.make_song_row("Song's title", 7, 1000, "B")
+    results["format_song_row"] = time_fast(lambda: se.format_song_row(row), repeat)
+    for count in ROW_COUNTS[:2]:
+        rows = make_rows(count)
+
+        def add_rows(buffer, rows=rows):
+            for row in rows:
+                buffer.add_row(row)
+
+        results[f"add_row/{count}"] = time_it(add_rows, repeat, se.ScriptBuffer)
+    return results
+
+
+def bench_show_script(repeat: int, folder: Path) -> dict:
+    """Redrawing the whole script, as show_script does, against the row count.
+
+    The Tk widget update isn't timed, only reading the file and making the text.
+    """
+    results = {}
+    for count in ROW_COUNTS:
+        buffer = se.ScriptBuffer()
+        buffer.load([make_rows(count)], closed=True)
+        script_name = folder / f"show_{count}.sql"
+        buffer.save(script_name)
+        results[f"open_text_file/{count}"] = time_it(
+            lambda: sf.open_text_file(script_name), repeat
+        )
+        results[f"text_cold/{count}"] = time_it(lambda: buffer.make_text(), repeat)
+        buffer.text()
+        results[f"text_cached/{count}"] = time_fast(buffer.text, repeat)
+    return results
+
+
+def bench_check_script(repeat: int) -> dict:
+    """check_sql_script, and splitting into statements, on big scripts."""
+    results = {}
+    for count in ROW_COUNTS:
+        script = se.create_script_text(make_rows(count))
+        results[f"check_sql_script/{count}"] = time_it(lambda: se.check_sql_script(script), repeat)
+        results[f"split_statements/{count}"] = time_it(lambda: se.split_statements(script), repeat)
+    return results
+
+
+def bench_commit(repeat: int, folder: Path) -> dict:
+    """Committing rows to a new database, as rows and as a script."""
+    results = {}
+    for count in ROW_COUNTS:
+        rows = make_rows(count)
+        script = se.create_script_text(rows)
+        # Big commits take a while, fewer runs of those.
+        runs = max(1, repeat // 3) if count >= 100_000 else repeat
+
+        def new_connection():
+            return sqlite3.connect(make_database(folder))
+
+        def insert_rows(connection, rows=rows):
+            se.insert_song_rows(connection, rows)
+            connection.close()
+
+        def run_script(connection, script=script):
+            se.run_script(connection, script)
+            connection.close()
+
+        results[f"insert_song_rows/{count}"] = time_it(insert_rows, runs, new_connection)
+        results[f"run_script/{count}"] = time_it(run_script, runs, new_connection)
+    return results
+
+
+def git_commit() -> str:
+    """The commit being benchmarked, empty if it's not a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, cwd=Path(__file__).parent, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(results: dict, baseline: dict) -> None:
+    """Print how much faster or slower each benchmark is than in the baseline."""
+    for group, benchmarks in results["benchmarks"].items():
+        for name, result in benchmarks.items():
+            before = baseline["benchmarks"].get(group, {}).get(name)
+            if before is None:
+                continue
+            ratio = result["best"] / before["best"]
+            print(f"{group + '/' + name:45} {before['best']:12.6f} {result['best']:12.6f} {ratio:6.2f}x")
+
+
+def get_args(argv: list = None) -> argparse.Namespace:
+    """Read the command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark sql_scripter.")
+    parser.add_argument("--output", type=Path, default=Path("bench.json"), help="JSON results file")
+    parser.add_argument("--compare", type=Path, help="JSON results from an earlier run")
+    parser.add_argument("--repeat", type=int, default=5, help="runs of each benchmark")
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    """Run the benchmarks and write the results, returns the exit code."""
+    args = get_args(argv)
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory() as folder:
+        folder = Path(folder)
+        results["benchmarks"]["next_song"] = bench_next_song(args.repeat)
+        results["benchmarks"]["show_script"] = bench_show_script(args.repeat, folder)
+        results["benchmarks"]["check_script"] = bench_check_script(args.repeat)
+        results["benchmarks"]["commit"] = bench_commit(args.repeat, folder)
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {args.output}", file=sys.stderr)
+
+    if args.compare:
+        with open(args.compare) as file:
+            compare(results, json.load(file))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
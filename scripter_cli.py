@@ -0,0 +1,184 @@
+"""
+Headless batch mode for sql_scripter, no GUI.
+Reads a tracklist and writes the same INSERT INTO catalog_song script
+as the Create Script / Next Song / Last Song buttons, or commits it.
+The tracklist is read a row at a time, so big dumps don't need to fit in memory.
+
+Tracklists are CSV, TSV or JSON with the fields album_id, side, number, title.
+side can be empty for a single CD. JSON can be one array of objects
+or one object per line.
+
+    python scripter_cli.py tracks.csv --script songs.sql
+    python scripter_cli.py tracks.json --commit A:/muse-test-many/musica/db.sqlite3
+"""
+import argparse
+import csv
+import itertools
+import json
+import sys
+from pathlib import Path
+from typing import Iterator, TextIO
+
+import scripter_db as sdb
+import scripter_engine as se
+
+TRACK_FIELDS = ("album_id", "side", "number", "title")
+
+# How much of a JSON file is read at a time.
+JSON_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_tracks(file: TextIO) -> Iterator[dict]:
+    """Read track objects one at a time from a JSON array or JSON lines file.
+
+    Args:
+        file (TextIO): open JSON file.
+
+    Yields:
+        dict: one track.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    at_end = False
+    while True:
+        # Skip whitespace and the array brackets and commas between objects.
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            position += 1
+        if position == len(buffer):
+            if at_end:
+                return
+            buffer, position = file.read(JSON_CHUNK_SIZE), 0
+            at_end = not buffer
+            continue
+        try:
+            track, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The object runs past the end of the buffer, read some more.
+            chunk = file.read(JSON_CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer, position = buffer[position:] + chunk, 0
+            continue
+        yield track
+        position = end
+
+
+def iter_tracks(filename: Path, file_format: str = None) -> Iterator[dict]:
+    """Read the tracks from a tracklist file, one at a time.
+
+    Args:
+        filename (pathlib.Path): CSV, TSV or JSON tracklist.
+        file_format (str, optional): "csv", "tsv" or "json".
+            Defaults to the file's extension.
+
+    Yields:
+        dict: one track, with at least the TRACK_FIELDS.
+    """
+    file_format = (file_format or Path(filename).suffix.lstrip(".")).lower()
+    # utf-8-sig skips the BOM Excel puts at the start of a CSV.
+    with open(filename, newline="", encoding="utf-8-sig") as file:
+        if file_format in ("json", "jsonl"):
+            yield from iter_json_tracks(file)
+        elif file_format in ("csv", "tsv"):
+            yield from csv.DictReader(file, delimiter="\t" if file_format == "tsv" else ",")
+        else:
+            raise ValueError(f"Unknown tracklist format: {file_format!r}")
+
+
+def track_to_row(track: dict) -> se.SongRow:
+    """Make a SongRow from a track, the way the GUI does from the song inputs.
+
+    Args:
+        track (dict): track with album_id, side, number and title.
+
+    Returns:
+        se.SongRow: row for the catalog_song table.
+    """
+    return se.make_song_row(
+        track["title"], int(track["number"]), track["album_id"], track.get("side") or ""
+    )
+
+
+def iter_rows(filename: Path, file_format: str = None) -> Iterator[se.SongRow]:
+    """Read the tracklist as SongRows, one at a time."""
+    return map(track_to_row, iter_tracks(filename, file_format))
+
+
+def write_script(file: TextIO, rows) -> int:
+    """Write the script for the rows, a row at a time.
+
+    The row before is held back until the next one is read,
+    so the last row can be closed with the semicolon.
+
+    Args:
+        file (TextIO): open file to write the script to.
+        rows (iterable): SongRows.
+
+    Returns:
+        int: number of rows written.
+
+    Raises:
+        ValueError: if there are no rows, a header on its own isn't valid sql.
+    """
+    rows = iter(rows)
+    if (previous := next(rows, None)) is None:
+        raise ValueError("The tracklist has no songs.")
+    file.write(se.script_header())
+    count = 1
+    for row in rows:
+        if previous is not None:
+            file.write(se.format_song_row(previous))
+        previous = row
+        count += 1
+    if previous is not None:
+        file.write(se.format_song_row(previous, last=True))
+    return count
+
+
+def get_args(argv: list = None) -> argparse.Namespace:
+    """Read the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description="Make or commit a catalog_song script from a tracklist."
+    )
+    parser.add_argument("tracklist", type=Path, help="CSV, TSV or JSON tracklist")
+    parser.add_argument(
+        "--format", choices=("csv", "tsv", "json"), help="defaults to the file extension"
+    )
+    output = parser.add_mutually_exclusive_group(required=True)
+    output.add_argument("--script", type=Path, help=".sql file to write, - for stdout")
+    output.add_argument("--commit", type=Path, help="db.sqlite3 to commit the rows to")
+    parser.add_argument(
+        "--batch-size", type=int, default=5000, help="rows per executemany when committing"
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list = None) -> int:
+    """Make or commit the script for a tracklist, returns the exit code."""
+    args = get_args(argv)
+    rows = iter_rows(args.tracklist, args.format)
+    # Checked before the script file is made or the database opened.
+    if (first := next(rows, None)) is None:
+        print(f"No songs in {args.tracklist}", file=sys.stderr)
+        return 1
+    rows = itertools.chain([first], rows)
+
+    if args.commit:
+        def progress(rows_written: int) -> None:
+            print(f"\r{rows_written} rows written", end="", file=sys.stderr)
+
+        with sdb.ConnectionManager(args.commit) as connection:
+            count = se.insert_song_rows(connection, rows, args.batch_size, progress)
+        print(f"\n{count} rows committed to {args.commit}", file=sys.stderr)
+    elif str(args.script) == "-":
+        count = write_script(sys.stdout, rows)
+    else:
+        with open(args.script, "w") as file:
+            count = write_script(file, rows)
+        print(f"{count} rows written to {args.script}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,936 @@
+"""
+Database connection for sql_scripter.
+One connection is opened for the app, tuned for commits,
+and reused for commits and lookups until the app exits.
+CatalogIndex keeps what's already in catalog_song in memory,
+so rows can be checked as they're added without querying the database.
+AlbumIndex keeps the album titles and artists in memory for the album picker.
+SchemaClone is an empty in memory copy of the tables, for dry runs of scripts.
+CatalogPager reads catalog_song a page at a time for the catalog browser.
+TitleIndex is a full text index of the song titles, for suggesting titles as they're typed.
+commit_copy() commits the same songs to another copy of the database,
+and catalog_fingerprint() is what the copies are compared with afterwards.
+oktl
+"""
+import bisect
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import NamedTuple
+
+import scripter_engine as se
+
+# Applied once when the connection is opened.
+# WAL needs shared memory, use "DELETE" for journal_mode if the database
+# is opened from more than one computer at a time over the network share.
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -64000,  # Negative is in KiB, about 64 MB of page cache.
+    "mmap_size": 268435456,  # 256 MB.
+    "temp_store": "MEMORY",
+}
+
+# Table with the albums, the songs' album_id points to it.
+ALBUM_TABLE = "catalog_album"
+
+# Columns the album picker looks for in the albums table, the first one found is used.
+ALBUM_TITLE_COLUMNS = ("album_title", "title", "album_name", "name")
+ALBUM_ARTIST_COLUMNS = ("artist_name", "album_artist", "artist")
+ALBUM_TRACK_COLUMNS = (
+    "num_tracks", "number_of_tracks", "track_count", "tracks",
+    "num_songs", "number_of_songs", "song_count", "songs",
+)
+# Name column of the artists table, if the albums point to one.
+ARTIST_NAME_COLUMNS = ("artist_name", "name", "artist", "title")
+
+
+class ConnectionManager:
+    """Long lived connection to the database.
+
+    The connection is opened the first time it's needed and kept open,
+    call close() when the app exits. It can be used from a worker thread,
+    hold the lock while using it so commits and lookups don't overlap.
+    Functions in on_connect are called with the new connection when it's
+    opened, to load whatever needs loading.
+    """
+
+    def __init__(self, db_path: Path, pragmas: dict = None) -> None:
+        """
+        Args:
+            db_path (pathlib.Path): Path to the sqlite database file.
+            pragmas (dict, optional): PRAGMAs to set on the connection.
+                Defaults to PRAGMAS.
+        """
+        self.db_path = Path(db_path)
+        self.pragmas = PRAGMAS if pragmas is None else pragmas
+        self._connection = None
+        self.lock = threading.RLock()
+        self.on_connect = []
+
+    def __enter__(self) -> sqlite3.Connection:
+        return self.connect()
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    @property
+    def is_open(self) -> bool:
+        """True if the connection has been opened and not closed."""
+        return self._connection is not None
+
+    def connect(self) -> sqlite3.Connection:
+        """Returns the open connection, opening it and setting the PRAGMAs if needed."""
+        with self.lock:
+            if self._connection is None:
+                connection = sqlite3.connect(self.db_path, check_same_thread=False)
+                for pragma, value in self.pragmas.items():
+                    connection.execute(f"PRAGMA {pragma} = {value}")
+                self._connection = connection
+                for callback in self.on_connect:
+                    callback(connection)
+            return self._connection
+
+    def interrupt(self) -> None:
+        """Stop whatever the connection is running, from any thread."""
+        if self._connection is not None:
+            self._connection.interrupt()
+
+    def close(self) -> None:
+        """Close the connection, if it's open."""
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+def normalize_title(title: str) -> str:
+    """Title for comparing, ignores case and extra spaces."""
+    return " ".join(title.casefold().split())
+
+
+class CatalogIndex:
+    """What's already in catalog_song, kept in memory for checking new rows.
+
+    Loaded once when the database connects. After that only the rows added
+    since the last load are read, after each commit or when the index is
+    older than ttl seconds, so songs added by other apps show up too.
+    All the checks are set lookups, nothing is queried per row. A load is
+    read into new sets that replace the old ones once they're whole, so the
+    main thread can check rows while a worker thread loads the index.
+    """
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        """
+        Args:
+            ttl (float, optional): seconds before the index should be refreshed.
+                Defaults to 300.
+        """
+        self.ttl = ttl
+        self.album_ids = set()
+        self.song_numbers = set()  # (album_id, song_number as str)
+        self.titles = set()  # (album_id, normalized title)
+        self.last_rowid = 0
+        self.loaded_at = None
+        self.has_album_table = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.loaded_at is not None
+
+    def is_stale(self) -> bool:
+        """True if the index hasn't been loaded or is older than ttl."""
+        return not self.is_loaded or time.monotonic() - self.loaded_at > self.ttl
+
+    def load(self, connection: sqlite3.Connection) -> None:
+        """Load the whole index, the album ids and all the songs."""
+        index = CatalogIndex(self.ttl)
+        try:
+            index.album_ids.update(
+                album_id for (album_id,) in connection.execute(f"SELECT id FROM {ALBUM_TABLE}")
+            )
+            index.has_album_table = True
+        except sqlite3.OperationalError:
+            # No albums table, so there's no way to tell if an album exists.
+            index.has_album_table = False
+        index.refresh(connection)
+        # Swapped in all at once, the old sets are never seen half cleared.
+        (self.album_ids, self.song_numbers, self.titles, self.has_album_table,
+            self.last_rowid, self.loaded_at) = (
+            index.album_ids, index.song_numbers, index.titles, index.has_album_table,
+            index.last_rowid, index.loaded_at)
+
+    def refresh(self, connection: sqlite3.Connection) -> int:
+        """Add the songs that were added since the last load or refresh.
+
+        Args:
+            connection (sqlite3.Connection): connection to database.
+
+        Returns:
+            int: number of songs added to the index.
+        """
+        songs = connection.execute(
+            "SELECT rowid, song_title, song_number, album_id FROM catalog_song "
+            "WHERE rowid > ? ORDER BY rowid",
+            (self.last_rowid,),
+        ).fetchall()
+        self.add_rows(row[1:] for row in songs)
+        if songs:
+            self.last_rowid = songs[-1][0]
+        self.loaded_at = time.monotonic()
+        return len(songs)
+
+    def add_rows(self, rows) -> None:
+        """Add (song_title, song_number, album_id) rows to the index."""
+        for song_title, song_number, album_id in rows:
+            self.album_ids.add(album_id)
+            self.song_numbers.add((album_id, str(song_number)))
+            self.titles.add((album_id, normalize_title(song_title)))
+
+    def album_exists(self, album_id: int) -> bool:
+        """True if the album is in the albums table, or if there isn't one to check."""
+        return not self.has_album_table or album_id in self.album_ids
+
+    def check_row(self, row) -> list:
+        """Check a row against what's already in the database.
+
+        Args:
+            row (se.SongRow): (song_title, song_number, album_id) row.
+
+        Returns:
+            list: a message for each conflict, empty if there aren't any.
+        """
+        song_title, song_number, album_id = row
+        conflicts = []
+        if not self.is_loaded:
+            return conflicts
+        if not self.album_exists(album_id):
+            conflicts.append(f"Album ID {album_id} is not in the database.")
+        if (album_id, str(song_number)) in self.song_numbers:
+            conflicts.append(f"Album {album_id} already has song number {song_number}.")
+        if (album_id, normalize_title(song_title)) in self.titles:
+            conflicts.append(f'Album {album_id} already has "{song_title}".')
+        return conflicts
+
+
+class Album(NamedTuple):
+    """An album from the albums table, for the album picker."""
+
+    album_id: int
+    title: str
+    artist: str
+    tracks: int | None  # None if the table doesn't have the number of songs.
+
+    def label(self) -> str:
+        """How the album is shown in the picker."""
+        artist = f" - {self.artist}" if self.artist else ""
+        return f"{self.title}{artist}  [{self.album_id}]"
+
+
+def first_column(columns, names: tuple) -> str | None:
+    """The first of names that's one of the columns."""
+    return next((name for name in names if name in columns), None)
+
+
+class AlbumIndex:
+    """Album titles and artists in memory, searched by the start of their words.
+
+    Loaded once when the database connects, then only the albums added
+    since, by rowid, are read. Every word of the title and artist is a key
+    into one sorted list, so a search is a bisect and never touches the disk.
+    The list is replaced, not changed, when albums are added, so it can be
+    searched from the main thread while a worker thread refreshes it.
+
+    The albums table's columns aren't fixed, the title, artist and number
+    of songs are the first of the usual column names it has, and the artist
+    can come from the table the albums point to.
+    """
+
+    def __init__(self) -> None:
+        self.albums = {}  # album_id: Album
+        self.keys = []  # sorted (words from one word of the album on, album_id)
+        self.last_rowid = 0
+        self.select = None  # Reads the albums, None if there's no albums table.
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.select is not None
+
+    def make_select(self, connection: sqlite3.Connection) -> str | None:
+        """Make the query for the albums from the columns the albums table has."""
+        columns = {row[1] for row in connection.execute(f"PRAGMA table_info({ALBUM_TABLE})")}
+        title = first_column(columns, ALBUM_TITLE_COLUMNS)
+        if "id" not in columns or title is None:
+            return None
+        tracks = first_column(columns, ALBUM_TRACK_COLUMNS)
+        artist = first_column(columns, ALBUM_ARTIST_COLUMNS)
+        artist_expression, join = f"album.{artist}" if artist else "''", ""
+        for foreign_key in connection.execute(f"PRAGMA foreign_key_list({ALBUM_TABLE})"):
+            table, from_column, to_column = foreign_key[2:5]
+            if "artist" not in f"{table} {from_column}".lower():
+                continue
+            artist_columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            if name := first_column(artist_columns, ARTIST_NAME_COLUMNS):
+                artist_expression = f"artist.{name}"
+                join = (
+                    f"LEFT JOIN {table} AS artist "
+                    f"ON artist.{to_column or 'id'} = album.{from_column}"
+                )
+                break
+        return (
+            f"SELECT album.rowid, album.id, album.{title}, {artist_expression}, "
+            f"{f'album.{tracks}' if tracks else 'NULL'} "
+            f"FROM {ALBUM_TABLE} AS album {join} WHERE album.rowid > ? ORDER BY album.rowid"
+        )
+
+    def load(self, connection: sqlite3.Connection) -> None:
+        """Load all the albums."""
+        self.albums = {}
+        self.keys = []
+        self.last_rowid = 0
+        self.select = None
+        try:
+            self.select = self.make_select(connection)
+        except sqlite3.OperationalError:
+            pass
+        if self.select is not None:
+            self.refresh(connection)
+
+    def refresh(self, connection: sqlite3.Connection) -> int:
+        """Add the albums that were added since the last load or refresh.
+
+        Args:
+            connection (sqlite3.Connection): connection to database.
+
+        Returns:
+            int: number of albums added.
+        """
+        if self.select is None:
+            return 0
+        rows = connection.execute(self.select, (self.last_rowid,)).fetchall()
+        if not rows:
+            return 0
+        albums, keys = dict(self.albums), []
+        for rowid, album_id, title, artist, tracks in rows:
+            album = Album(album_id, str(title or ""), str(artist or ""), tracks)
+            albums[album_id] = album
+            words = normalize_title(f"{album.title} {album.artist}").split()
+            keys.extend((" ".join(words[start:]), album_id) for start in range(len(words)))
+        keys.sort()
+        # Merging two sorted lists is quick, and the old one stays whole until it's swapped.
+        self.keys = sorted(self.keys + keys) if self.keys else keys
+        self.albums = albums
+        self.last_rowid = rows[-1][0]
+        return len(rows)
+
+    def search(self, text: str, limit: int = 12) -> list:
+        """Albums with words starting with the words typed, in order of the text matched.
+
+        Args:
+            text (str): the start of words of the title or artist, or an album id.
+            limit (int, optional): most albums to return. Defaults to 12.
+
+        Returns:
+            list: Albums, the one with the id typed first.
+        """
+        typed = normalize_title(text)
+        if not typed:
+            return []
+        found = {}
+        if typed.isdigit() and int(typed) in self.albums:
+            found[int(typed)] = self.albums[int(typed)]
+        # The typed words in a row, ie. "dark side", then any other words anywhere.
+        words = typed.split()
+        keys = self.keys
+        start = bisect.bisect_left(keys, (words[0],))
+        for index in range(start, len(keys)):
+            key, album_id = keys[index]
+            if not key.startswith(words[0]):
+                break
+            if album_id in found:
+                continue
+            album = self.albums[album_id]
+            album_words = normalize_title(f"{album.title} {album.artist}").split()
+            if all(any(word.startswith(part) for word in album_words) for part in words[1:]):
+                found[album_id] = album
+                if len(found) >= limit:
+                    break
+        return list(found.values())
+
+    def get(self, album_id) -> Album | None:
+        """The album with the id, None if it's not in the table or not a number."""
+        try:
+            return self.albums.get(int(album_id))
+        except (TypeError, ValueError):
+            return None
+
+
+class SchemaClone:
+    """Empty copy of catalog_song and the tables it points to, in memory.
+
+    Scripts are dry run on the copy before they're committed, so a bad
+    column name or constraint is found without holding a write lock on
+    the real database. The copy is made once, when the database connects.
+    """
+
+    def __init__(self, tables: tuple = ("catalog_song",)) -> None:
+        """
+        Args:
+            tables (tuple, optional): tables to copy, the tables their foreign
+                keys point to are copied too. Defaults to ("catalog_song",).
+        """
+        self.tables = tables
+        self.connection = None
+        self.lock = threading.Lock()
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.connection is not None
+
+    def related_tables(self, connection: sqlite3.Connection) -> list:
+        """The tables to copy, with the ones their foreign keys point to."""
+        tables = list(self.tables)
+        for table in tables:
+            for foreign_key in connection.execute(f"PRAGMA foreign_key_list({table})"):
+                if foreign_key[2] not in tables:
+                    tables.append(foreign_key[2])
+        return tables
+
+    def load(self, connection: sqlite3.Connection) -> None:
+        """Copy the schema of the tables from the database into a new in memory database.
+
+        Args:
+            connection (sqlite3.Connection): connection to the real database.
+        """
+        tables = self.related_tables(connection)
+        marks = ", ".join("?" * len(tables))
+        # Tables first, then their indexes and triggers.
+        schema = connection.execute(
+            f"SELECT sql FROM sqlite_master WHERE tbl_name IN ({marks}) AND sql IS NOT NULL "
+            "ORDER BY type != 'table'",
+            tables,
+        ).fetchall()
+        clone = sqlite3.connect(":memory:", check_same_thread=False)
+        for (sql,) in schema:
+            clone.execute(sql)
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+            self.connection = clone
+
+    def dry_run(self, script: str) -> list:
+        """Run the script on the copy and roll it back.
+
+        Args:
+            script (str): sql script to check.
+
+        Returns:
+            list: se.ScriptErrors, empty if the whole script would work.
+        """
+        with self.lock:
+            return se.dry_run(self.connection, script)
+
+
+class CopyResult(NamedTuple):
+    """How the commit to one copy of the database went."""
+
+    db_path: Path
+    rows: int
+    seconds: float
+    error: str  # Empty if it committed.
+    fingerprint: tuple | None  # From catalog_fingerprint(), None if it couldn't be read.
+
+
+def catalog_fingerprint(connection: sqlite3.Connection, album_ids) -> tuple:
+    """What's needed to tell if two copies of catalog_song are the same.
+
+    Checksumming the whole table would take too long on a big catalog, so
+    only the songs of the albums just committed are checksummed, with the
+    number of songs in the whole table.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        album_ids (iterable): the albums committed.
+
+    Returns:
+        tuple: (songs in catalog_song, checksum of the albums' songs).
+    """
+    songs = connection.execute("SELECT count(*) FROM catalog_song").fetchone()[0]
+    rows = []
+    album_ids = list(album_ids)
+    # sqlite only takes so many ? in one query.
+    for start in range(0, len(album_ids), 500):
+        chunk = album_ids[start:start + 500]
+        marks = ", ".join("?" * len(chunk))
+        rows.extend(
+            tuple(map(str, row)) for row in connection.execute(
+                "SELECT album_id, song_number, song_title FROM catalog_song "
+                f"WHERE album_id IN ({marks})",
+                chunk,
+            )
+        )
+    checksum = hashlib.blake2b(digest_size=16)
+    for row in sorted(rows):
+        checksum.update("\x1f".join(row).encode("utf-8") + b"\x1e")
+    return songs, checksum.hexdigest()
+
+
+def commit_copy(
+    db_path: Path,
+    albums: list,
+    script: str,
+    album_ids,
+    upsert: bool = False,
+    albums_per_commit: int = 0,
+    cancel: threading.Event = None,
+) -> CopyResult:
+    """Commit the albums, or the script, to another copy of the database.
+
+    Runs in a worker thread, with its own connection and transactions,
+    so the copies are committed at the same time as the main database.
+
+    Args:
+        db_path (pathlib.Path): the copy's database file.
+        albums (list): a list of SongRows for each album, empty to execute the script.
+        script (str): script text to execute if there are no albums.
+        album_ids (iterable): the albums committed, for the fingerprint.
+        upsert (bool, optional): update songs already in the copy. Defaults to False.
+        albums_per_commit (int, optional): albums in each transaction. Defaults to all.
+        cancel (threading.Event, optional): set to stop between batches.
+
+    Returns:
+        CopyResult: the rows written, or the error, and the copy's fingerprint.
+    """
+    db_path = Path(db_path)
+    start = time.perf_counter()
+    if not db_path.exists():
+        # sqlite would make a new empty database.
+        return CopyResult(db_path, 0, 0.0, "No database at this path.", None)
+    rows, error, fingerprint = 0, "", None
+    with ConnectionManager(db_path) as connection:
+        try:
+            if upsert and not se.has_song_index(connection):
+                raise sqlite3.OperationalError("No unique index on album_id and song_number.")
+            if albums and upsert:
+                rows = se.commit_albums(
+                    connection, albums, albums_per_commit, cancel=cancel, upsert=True).rows
+            elif albums:
+                rows = se.commit_albums(connection, albums, albums_per_commit, cancel=cancel)
+            else:
+                report = se.run_script(connection, script, cancel=cancel, upsert=upsert)
+                rows = sum(statement.rows for statement in report)
+        except se.CommitCancelled as cancelled:
+            rows = cancelled.args[0] if cancelled.args else 0
+            error = "Cancelled."
+        except sqlite3.Error as problem:
+            error = str(problem)
+        # Read even after an error, a copy that's now different has to be seen.
+        try:
+            fingerprint = catalog_fingerprint(connection, album_ids)
+        except sqlite3.Error:
+            pass
+    return CopyResult(db_path, rows, time.perf_counter() - start, error, fingerprint)
+
+
+def compare_copies(main: tuple | None, results: list) -> list:
+    """Lines saying how each copy's commit went and if it matches the main database.
+
+    Args:
+        main (tuple): the main database's fingerprint, None if it couldn't be read.
+        results (list): a CopyResult for each copy.
+
+    Returns:
+        list: a line for each copy.
+    """
+    lines = []
+    for result in results:
+        name = result.db_path.parent.name or str(result.db_path)
+        if result.error:
+            status = f"{name}: {result.error}"
+        else:
+            status = f"{name}: {result.rows} rows in {result.seconds:.2f} s"
+        if main is None or result.fingerprint is None:
+            status += ", could not be compared."
+        elif result.fingerprint[0] != main[0]:
+            status += f", DIFFERENT, {result.fingerprint[0]} songs, the main one has {main[0]}."
+        elif result.fingerprint[1] != main[1]:
+            status += ", DIFFERENT, the albums committed don't match the main one."
+        else:
+            status += ", matches."
+        lines.append(status)
+    return lines
+
+
+class BrowseQuery(NamedTuple):
+    """One page for the catalog browser to read."""
+
+    generation: int  # Pages from an older generation are thrown away.
+    album_id: int | None  # None for the whole catalog.
+    after: int | None  # The page starts after this rowid.
+    before: int | None  # The page ends before this rowid.
+    from_end: bool  # The last page, newest songs.
+    replace: bool  # The page replaces what's shown instead of adding to it.
+
+
+class CatalogPager:
+    """Pages through catalog_song for the catalog browser.
+
+    Pages are read after the last rowid shown or before the first one,
+    never with OFFSET, so a page at the end of millions of songs is read
+    as quick as the first. For one album the album_id index gives the
+    album's songs in rowid order, so that's quick too.
+
+    Only max_pages pages are kept, the one at the other end is dropped as
+    the next is added, so the table never holds more than a few hundred rows.
+    fetch() runs in a worker thread on its own read only connection, so
+    browsing doesn't wait for a commit. Everything else is for the main thread.
+    """
+
+    def __init__(self, db_path: Path, page_size: int = 100, max_pages: int = 3) -> None:
+        """
+        Args:
+            db_path (pathlib.Path): Path to the sqlite database file.
+            page_size (int, optional): rows read at a time. Defaults to 100.
+            max_pages (int, optional): pages kept in the table. Defaults to 3.
+        """
+        self.db_path = Path(db_path)
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.pages = deque()
+        self.generation = 0
+        self.album_id = None
+        self.pending = None
+        self.at_start = False
+        self.at_end = False
+        self._connection = None
+        self.lock = threading.Lock()
+
+    @property
+    def rows(self) -> list:
+        """The rows to show, [rowid, album_id, song_number, song_title] each."""
+        return [row for page in self.pages for row in page]
+
+    def query(self, **fields) -> BrowseQuery:
+        """Make the query for the next page to read, it's the one pending until it's added."""
+        defaults = dict(after=None, before=None, from_end=False, replace=False)
+        self.pending = BrowseQuery(self.generation, self.album_id, **{**defaults, **fields})
+        return self.pending
+
+    def start(self, album_id: int = None, from_end: bool = False) -> BrowseQuery:
+        """Start over at the first or last page, of one album or the whole catalog.
+
+        Returns:
+            BrowseQuery: the page to read.
+        """
+        self.generation += 1
+        self.album_id = album_id
+        return self.query(from_end=from_end, replace=True)
+
+    def reload(self) -> BrowseQuery:
+        """Read the page shown again from its first row, ie. after titles were updated."""
+        if not self.pages:
+            return self.start(self.album_id)
+        self.generation += 1
+        return self.query(after=self.pages[0][0][0] - 1, replace=True)
+
+    def next_query(self) -> BrowseQuery | None:
+        """The page after the rows shown, None if there isn't one or a page is being read."""
+        if self.pending or self.at_end or not self.pages:
+            return None
+        return self.query(after=self.pages[-1][-1][0])
+
+    def previous_query(self) -> BrowseQuery | None:
+        """The page before the rows shown, None if there isn't one or a page is being read."""
+        if self.pending or self.at_start or not self.pages:
+            return None
+        return self.query(before=self.pages[0][0][0])
+
+    def more_query(self) -> BrowseQuery | None:
+        """The page after the rows shown, even if it was the end, for songs just committed."""
+        if not self.pages:
+            return None if self.pending else self.start(self.album_id)
+        self.at_end = False
+        return self.next_query()
+
+    def connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            uri = f"{self.db_path.resolve().as_uri()}?mode=ro"
+            self._connection = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._connection
+
+    def fetch(self, query: BrowseQuery) -> list:
+        """Read the page, runs in a worker thread.
+
+        Args:
+            query (BrowseQuery): the page to read.
+
+        Returns:
+            list: the page's rows in rowid order, [rowid, album_id, song_number, song_title] each.
+        """
+        conditions, parameters = [], []
+        if query.album_id is not None:
+            conditions.append("album_id = ?")
+            parameters.append(query.album_id)
+        if query.after is not None:
+            conditions.append("rowid > ?")
+            parameters.append(query.after)
+        if query.before is not None:
+            conditions.append("rowid < ?")
+            parameters.append(query.before)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        backwards = query.before is not None or query.from_end
+        sql = (
+            "SELECT rowid, album_id, song_number, song_title FROM catalog_song "
+            f"{where}ORDER BY rowid {'DESC' if backwards else 'ASC'} LIMIT ?"
+        )
+        with self.lock:
+            rows = self.connect().execute(sql, (*parameters, self.page_size)).fetchall()
+        if backwards:
+            rows.reverse()
+        return [list(row) for row in rows]
+
+    def add_page(self, query: BrowseQuery, rows: list) -> int | None:
+        """Add a page that was read to the rows shown.
+
+        Args:
+            query (BrowseQuery): the query the page was read for.
+            rows (list): the page, from fetch().
+
+        Returns:
+            int: how many rows the rows already shown moved down, negative if
+                they moved up, to keep the table scrolled to the same songs.
+                None if the page is from an older generation and was thrown away.
+        """
+        if query.generation != self.generation:
+            return None
+        self.pending = None
+        full = len(rows) == self.page_size
+        if query.replace:
+            self.pages = deque([rows] if rows else [])
+            self.at_start = not full if query.from_end else query.after is None
+            self.at_end = query.from_end or not full
+            return 0
+        if query.before is not None:
+            self.at_start = not full
+            if not rows:
+                return 0
+            self.pages.appendleft(rows)
+            if len(self.pages) > self.max_pages:
+                self.pages.pop()
+                self.at_end = False
+            return len(rows)
+        self.at_end = not full
+        if not rows:
+            return 0
+        self.pages.append(rows)
+        if len(self.pages) > self.max_pages:
+            self.at_start = False
+            return -len(self.pages.popleft())
+        return 0
+
+    def close(self) -> None:
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+
+
+class TitleIndex:
+    """FTS5 index of catalog_song's titles, for suggestions as a title is typed.
+
+    The index is kept in its own file next to the app, the database itself
+    isn't changed. It's built in batches the first time, after that only the
+    songs added since, by rowid, and the albums whose titles were updated are
+    read again. It's read through the database attached read only.
+
+    Each lookup gets a generation, starting a new one cancels the one
+    running, so only the suggestions for the latest text come back.
+    If sqlite was built without FTS5 there are no suggestions.
+    """
+
+    def __init__(
+        self,
+        index_path: Path,
+        db_path: Path,
+        limit: int = 8,
+        min_chars: int = 2,
+        batch_size: int = 1000,
+    ) -> None:
+        """
+        Args:
+            index_path (pathlib.Path): file for the index.
+            db_path (pathlib.Path): Path to the sqlite database file.
+            limit (int, optional): most suggestions for a lookup. Defaults to 8.
+            min_chars (int, optional): letters of the last word typed before
+                titles are looked up. Defaults to 2.
+            batch_size (int, optional): songs indexed at a time, lookups wait
+                at most one batch. Defaults to 1000.
+        """
+        self.index_path = Path(index_path)
+        self.db_path = Path(db_path)
+        self.limit = limit
+        self.min_chars = min_chars
+        self.batch_size = batch_size
+        self.generation = 0
+        self.available = True
+        self._connection = None
+        self.lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """Open the index, making it if it's new, with the database attached as catalog."""
+        if self._connection is None:
+            connection = sqlite3.connect(self.index_path, check_same_thread=False)
+            try:
+                connection.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS song_titles USING fts5("
+                    "song_title, prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+                )
+            except sqlite3.OperationalError:
+                # No FTS5 in this sqlite.
+                connection.close()
+                self.available = False
+                raise
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS index_info (name TEXT PRIMARY KEY, value)"
+            )
+            connection.execute(
+                "ATTACH DATABASE ? AS catalog", (f"{self.db_path.resolve().as_uri()}?mode=ro",)
+            )
+            self._connection = connection
+        return self._connection
+
+    def info(self, name: str, default=None):
+        row = self._connection.execute(
+            "SELECT value FROM index_info WHERE name = ?", (name,)
+        ).fetchone()
+        return default if row is None else row[0]
+
+    def set_info(self, name: str, value) -> None:
+        self._connection.execute(
+            "INSERT OR REPLACE INTO index_info (name, value) VALUES (?, ?)", (name, value)
+        )
+
+    def refresh(self, album_ids=()) -> int:
+        """Index the songs added since the last refresh, runs in a worker thread.
+
+        Args:
+            album_ids (iterable, optional): albums to read again, their titles
+                were updated.
+
+        Returns:
+            int: number of songs indexed.
+        """
+        with self.lock:
+            connection = self.connect()
+            last_song = connection.execute(
+                "SELECT coalesce(max(rowid), 0) FROM catalog.catalog_song"
+            ).fetchone()[0]
+            last_rowid = self.info("last_rowid", 0)
+            if self.info("db_path") != str(self.db_path) or last_song < last_rowid:
+                # Another database, or songs were removed, so start over.
+                with connection:
+                    connection.execute("DELETE FROM song_titles")
+                    self.set_info("db_path", str(self.db_path))
+                    self.set_info("last_rowid", 0)
+                last_rowid = 0
+            if album_ids := list(album_ids):
+                marks = ", ".join("?" * len(album_ids))
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO song_titles (rowid, song_title) "
+                        "SELECT rowid, song_title FROM catalog.catalog_song "
+                        f"WHERE album_id IN ({marks}) AND rowid <= ?",
+                        (*album_ids, last_rowid),
+                    )
+        indexed = 0
+        while True:
+            # The lock is let go between batches, so lookups can run while it's built.
+            with self.lock, self._connection as connection:
+                # Read again each batch, a refresh after a commit can run alongside.
+                last_rowid = self.info("last_rowid", 0)
+                if last_rowid >= last_song:
+                    break
+                batch_end = min(last_rowid + self.batch_size, last_song)
+                indexed += connection.execute(
+                    "INSERT INTO song_titles (rowid, song_title) "
+                    "SELECT rowid, song_title FROM catalog.catalog_song "
+                    "WHERE rowid > ? AND rowid <= ?",
+                    (last_rowid, batch_end),
+                ).rowcount
+                last_rowid = batch_end
+                self.set_info("last_rowid", last_rowid)
+        return indexed
+
+    def match_expression(self, text: str) -> str | None:
+        """FTS5 query for the text, the last word is a prefix. None if it's too short."""
+        words = re.findall(r"\w+", text)
+        if not words or len(words[-1]) < self.min_chars:
+            return None
+        return " ".join(f'"{word}"' for word in words) + "*"
+
+    def start_lookup(self, text: str) -> int | None:
+        """Cancel the lookup running and start a new one, from the main thread.
+
+        Returns:
+            int: generation to pass to lookup(), None if there's nothing to look up.
+        """
+        self.generation += 1
+        if not self.available or self.match_expression(text) is None:
+            return None
+        return self.generation
+
+    def cancel(self) -> None:
+        """Cancel the lookup running, ie. when the title has been used."""
+        self.generation += 1
+
+    def lookup(self, generation: int, text: str) -> list | None:
+        """Titles with words starting like the text, runs in a worker thread.
+
+        Args:
+            generation (int): from start_lookup().
+            text (str): the title typed so far.
+
+        Returns:
+            list: titles, the ones starting with the text first, then the shortest.
+                None if the lookup was cancelled.
+        """
+
+        def cancelled():
+            return generation != self.generation
+
+        with self.lock:
+            if cancelled():
+                return None
+            connection = self.connect()
+            # sqlite stops the query part way through once a newer lookup is started.
+            connection.set_progress_handler(cancelled, 1000)
+            try:
+                # No ORDER BY, so it stops at the limit instead of scoring every match.
+                rows = connection.execute(
+                    "SELECT song_title FROM song_titles WHERE song_titles MATCH ? LIMIT ?",
+                    (self.match_expression(text), self.limit * 6),
+                ).fetchall()
+            except sqlite3.OperationalError:
+                if cancelled():
+                    return None
+                raise
+            finally:
+                connection.set_progress_handler(None, 0)
+        titles = {}
+        for (title,) in rows:
+            titles.setdefault(normalize_title(title), title)
+        typed = normalize_title(text)
+        return sorted(
+            titles.values(),
+            key=lambda title: (not normalize_title(title).startswith(typed), len(title)),
+        )[: self.limit]
+
+    def close(self) -> None:
+        with self.lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,1295 @@
+"""
+Song rows and insert engine for sql_scripter.
+Rows are kept as typed tuples and committed with executemany,
+the .sql script is only made as an export of the rows.
+Scripts edited by hand are split into statements and run in one transaction.
+oktl
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import time
+from array import array
+from collections import deque
+from contextlib import contextmanager
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+SCRIPT_HEADER = "INSERT INTO catalog_song (song_title, song_number, album_id)"
+INSERT_SONG = (
+    "INSERT INTO catalog_song (song_title, song_number, album_id) VALUES (?, ?, ?)"
+)
+# Upserts need this unique index, a song number can only be on an album once.
+SONG_INDEX = "catalog_song_album_song_number"
+UPSERT_CLAUSE = (
+    " ON CONFLICT (album_id, song_number) DO UPDATE SET song_title = excluded.song_title"
+    " WHERE song_title IS NOT excluded.song_title"
+)
+UPSERT_SONG = INSERT_SONG + UPSERT_CLAUSE
+FIND_SONG = "SELECT song_title FROM catalog_song WHERE album_id = ? AND song_number = ?"
+# Statements that start or end a transaction, a script is already run in one.
+TRANSACTION_KEYWORDS = {"BEGIN", "COMMIT", "END", "ROLLBACK", "SAVEPOINT", "RELEASE"}
+TRANSACTION_MESSAGE = (
+    "{keyword} isn't needed, the script is committed in one transaction. Take it out."
+)
+
+
+class CommitCancelled(Exception):
+    """Raised when a commit is cancelled, the transaction is rolled back."""
+
+
+class UpsertCounts(NamedTuple):
+    """What an upsert did with the rows."""
+
+    inserted: int = 0
+    updated: int = 0  # Already there with a different title.
+    unchanged: int = 0  # Already there just the same.
+
+    def __add__(self, other: "UpsertCounts") -> "UpsertCounts":
+        return UpsertCounts(*(mine + theirs for mine, theirs in zip(self, other)))
+
+    @property
+    def rows(self) -> int:
+        return self.inserted + self.updated + self.unchanged
+
+
+class SongRow(NamedTuple):
+    """One row for the catalog_song table."""
+
+    song_title: str
+    song_number: int | str
+    album_id: int
+
+
+def make_song_row(song_title: str, song_number: int, album_id, album_side: str = "") -> SongRow:
+    """Creates a SongRow from the song inputs.
+
+    Args:
+        song_title (str): The title of the song, from -TITLE- input
+        song_number (int): the number of the song, from -SONG-NUMBER- input
+        album_id (str or int): the album id for the song, from -ALBUM-ID- input
+        album_side (str, optional): LP side or CD number, ie. "A" makes the
+            song number "A-1". Defaults to "" for a single CD.
+
+    Returns:
+        SongRow: typed row for the catalog_song table.
+    """
+    if album_side:
+        song_number = f"{album_side}-{song_number}"
+    return SongRow(song_title, song_number, int(album_id))
+
+
+def split_song_number(song_number: int | str) -> tuple:
+    """Split a song number back into the side and number, ie. "A-3" is ("A", 3).
+
+    Args:
+        song_number (int or str): song number from a SongRow.
+
+    Returns:
+        tuple: (album side, or "" for a single CD, song number).
+    """
+    if isinstance(song_number, int):
+        return "", song_number
+    album_side, _, number = str(song_number).rpartition("-")
+    return album_side, int(number)
+
+
+def sql_literal(value) -> str:
+    """Make a value into an sql literal, quotes inside strings are doubled.
+
+    Args:
+        value (int or str): value of one field of a row.
+
+    Returns:
+        str: the value as it would be written in an sql script.
+    """
+    if isinstance(value, int):
+        return str(value)
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def format_song_row(row: Iterable, last: bool = False) -> str:
+    """Format a row as a line of the VALUES part of the script.
+
+    Args:
+        row (SongRow): row to format.
+        last (bool, optional): True puts the closing semicolon on the row
+            instead of a comma. Defaults to False.
+
+    Returns:
+        str: the row as a line for the script, ie. "\\n ('Song', 1, 10),"
+    """
+    fields = ", ".join(sql_literal(value) for value in row)
+    return f"\n ({fields}){';' if last else ','}"
+
+
+def script_header() -> str:
+    """Returns the first lines of the script, before the rows."""
+    return f"{SCRIPT_HEADER}\n\nVALUES"
+
+
+def create_script_text(rows: list) -> str:
+    """Make the whole sql script for the rows.
+
+    Args:
+        rows (list): list of SongRows.
+
+    Returns:
+        str: the sql script, the last row is closed with a semicolon.
+    """
+    last_row = len(rows) - 1
+    lines = (format_song_row(row, index == last_row) for index, row in enumerate(rows))
+    return script_header() + "".join(lines)
+
+
+def export_script(filename: Path, rows: list) -> None:
+    """Write the rows out as a .sql script.
+
+    Args:
+        filename (pathlib.Path): Path to the .sql file.
+        rows (list): list of SongRows.
+    """
+    with open(filename, "w") as file:
+        file.write(create_script_text(rows))
+
+
+@contextmanager
+def transaction(connection: sqlite3.Connection) -> Iterator[sqlite3.Connection]:
+    """Run the block in one transaction, commit if it works, roll back if it doesn't.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+    """
+    connection.execute("BEGIN")
+    try:
+        yield connection
+    except BaseException:
+        connection.rollback()
+        raise
+    connection.commit()
+
+
+# This is not doing what I hoped it would, only checks for closing semi-colon.
+# Only a problem when editing a script.
+def check_sql_script(script: str) -> bool:
+    """Uses sqlite3 function to check script for unclosed string literals and closing semicolon.
+
+    Args:
+        script (str): sql script to check.
+
+    Returns:
+        bool: True if sting literals are closed and final statement has closing semicolon,
+                otherwise False.
+    """
+    return sqlite3.complete_statement(script)
+
+
+def script_hash(script: str) -> str:
+    """Fingerprint of a script, to tell if it changed after it was checked."""
+    return hashlib.sha256(script.encode("utf-8")).hexdigest()
+
+
+def batched(rows: Iterable, batch_size: int) -> Iterator[list]:
+    """Split rows into lists of batch_size rows, the last one may be shorter.
+
+    Args:
+        rows (iterable): rows to split up.
+        batch_size (int): number of rows in each batch.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def insert_song_rows(
+    connection: sqlite3.Connection,
+    rows: Iterable,
+    batch_size: int = 500,
+    progress=None,
+    cancel=None,
+) -> int:
+    """Insert the rows into catalog_song with executemany in one transaction.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        rows (iterable): SongRows, or any (song_title, song_number, album_id) tuples.
+        batch_size (int, optional): rows per executemany, progress is reported
+            after each batch. Defaults to 500.
+        progress (callable, optional): called with the number of rows written so far.
+        cancel (threading.Event, optional): when set the commit stops and the
+            transaction is rolled back.
+
+    Raises:
+        CommitCancelled: if cancel was set before the transaction was committed.
+
+    Returns:
+        int: number of rows inserted.
+    """
+    rows_written = 0
+    with transaction(connection):
+        for batch in batched(rows, batch_size):
+            if cancel is not None and cancel.is_set():
+                raise CommitCancelled
+            rows_written += connection.executemany(INSERT_SONG, batch).rowcount
+            if progress is not None:
+                progress(rows_written)
+        if cancel is not None and cancel.is_set():
+            raise CommitCancelled
+    return rows_written
+
+
+def has_song_index(connection: sqlite3.Connection) -> bool:
+    """True if catalog_song has a unique index on (album_id, song_number), for upserts."""
+    for index in connection.execute("PRAGMA index_list(catalog_song)").fetchall():
+        name, unique = index[1], index[2]
+        columns = {info[2] for info in connection.execute(f"PRAGMA index_info('{name}')")}
+        if unique and columns == {"album_id", "song_number"}:
+            return True
+    return False
+
+
+def create_song_index(connection: sqlite3.Connection) -> None:
+    """Create the unique index on (album_id, song_number) that upserts need.
+
+    Raises:
+        sqlite3.IntegrityError: if some album already has a song number twice,
+            they need sorting out first.
+    """
+    duplicates = connection.execute(
+        "SELECT album_id, song_number, count(*) FROM catalog_song "
+        "GROUP BY album_id, song_number HAVING count(*) > 1 LIMIT 5"
+    ).fetchall()
+    if duplicates:
+        examples = ", ".join(
+            f"album {album_id} song {song_number} x{count}"
+            for album_id, song_number, count in duplicates
+        )
+        raise sqlite3.IntegrityError(f"Songs are in catalog_song more than once: {examples}")
+    with transaction(connection):
+        connection.execute(
+            f"CREATE UNIQUE INDEX IF NOT EXISTS {SONG_INDEX} ON catalog_song (album_id, song_number)"
+        )
+
+
+def count_upsert(connection: sqlite3.Connection, batch: list, seen: dict) -> UpsertCounts:
+    """Work out what upserting the batch will do, before it's written.
+
+    Each row is one lookup on the unique index.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        batch (list): SongRows about to be upserted.
+        seen (dict): (album_id, song_number): title of the rows earlier in the
+            same upsert, it's added to.
+    """
+    inserted = updated = unchanged = 0
+    for song_title, song_number, album_id in batch:
+        key = (album_id, song_number)
+        if key in seen:
+            title = seen[key]
+        elif found := connection.execute(FIND_SONG, (album_id, song_number)).fetchone():
+            title = found[0]
+        else:
+            title = None
+        if title is None:
+            inserted += 1
+        elif title == song_title:
+            unchanged += 1
+        else:
+            updated += 1
+        seen[key] = song_title
+    return UpsertCounts(inserted, updated, unchanged)
+
+
+def upsert_song_rows(
+    connection: sqlite3.Connection,
+    rows: Iterable,
+    batch_size: int = 500,
+    progress=None,
+    cancel=None,
+) -> UpsertCounts:
+    """Insert the rows, or update the titles of songs that are already there, in one transaction.
+
+    A row is the same song if it has the same album_id and song_number, so
+    committing the same script twice doesn't add the songs twice. Needs the
+    unique index from create_song_index.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        rows (iterable): SongRows, or any (song_title, song_number, album_id) tuples.
+        batch_size (int, optional): rows per executemany. Defaults to 500.
+        progress (callable, optional): called with the number of rows written so far.
+        cancel (threading.Event, optional): when set the transaction is rolled back.
+
+    Raises:
+        CommitCancelled: if cancel was set before the transaction was committed.
+
+    Returns:
+        UpsertCounts: rows inserted, updated and unchanged.
+    """
+    counts = UpsertCounts()
+    seen = {}
+    with transaction(connection):
+        for batch in batched(rows, batch_size):
+            if cancel is not None and cancel.is_set():
+                raise CommitCancelled
+            counts += count_upsert(connection, batch, seen)
+            connection.executemany(UPSERT_SONG, batch)
+            if progress is not None:
+                progress(counts.rows)
+        if cancel is not None and cancel.is_set():
+            raise CommitCancelled
+    return counts
+
+
+def commit_albums(
+    connection: sqlite3.Connection,
+    albums: list,
+    albums_per_commit: int = 0,
+    progress=None,
+    cancel=None,
+    upsert: bool = False,
+) -> int | UpsertCounts:
+    """Insert the rows of all the albums, in one transaction or a few albums at a time.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        albums (list): a list of SongRows for each album.
+        albums_per_commit (int, optional): albums in each transaction,
+            0 commits them all in one. Defaults to 0.
+        progress (callable, optional): called with the number of rows written so far.
+        cancel (threading.Event, optional): when set the commit stops and the
+            transaction it's in is rolled back.
+        upsert (bool, optional): True updates songs that are already there
+            instead of adding them again, see upsert_song_rows. Defaults to False.
+
+    Raises:
+        CommitCancelled: if cancel was set, its argument is the number of rows
+            that were already committed in earlier transactions.
+
+    Returns:
+        int: number of rows inserted, or UpsertCounts if upsert is True.
+    """
+    albums_per_commit = albums_per_commit or len(albums) or 1
+    rows_committed = 0
+    counts = UpsertCounts()
+    for start in range(0, len(albums), albums_per_commit):
+        rows = [row for album in albums[start:start + albums_per_commit] for row in album]
+
+        def batch_progress(rows_written: int, offset: int = rows_committed) -> None:
+            if progress is not None:
+                progress(offset + rows_written)
+
+        try:
+            if upsert:
+                batch_counts = upsert_song_rows(
+                    connection, rows, progress=batch_progress, cancel=cancel)
+                counts += batch_counts
+                rows_committed += batch_counts.rows
+            else:
+                rows_committed += insert_song_rows(
+                    connection, rows, progress=batch_progress, cancel=cancel)
+        except CommitCancelled:
+            raise CommitCancelled(rows_committed) from None
+        except sqlite3.OperationalError:
+            # connection.interrupt() stops a batch part way with an error.
+            if cancel is not None and cancel.is_set():
+                raise CommitCancelled(rows_committed) from None
+            raise
+    return counts if upsert else rows_committed
+
+
+class Statement(NamedTuple):
+    """One statement of a script and the line of the script it starts on."""
+
+    line: int
+    sql: str
+
+
+class ScriptError(NamedTuple):
+    """A statement of a script that failed, and the line it starts on."""
+
+    line: int
+    message: str
+
+
+class StatementReport(NamedTuple):
+    """What running one statement did."""
+
+    number: int
+    line: int
+    rows: int
+    milliseconds: float
+
+
+def is_comment_only(text: str) -> bool:
+    """True if text has nothing in it but blank lines and -- comments."""
+    return all(
+        not line.strip() or line.strip().startswith("--") for line in text.splitlines()
+    )
+
+
+def split_statements(script: str) -> list:
+    """Split a script into its statements.
+
+    A semicolon only ends a statement when sqlite3.complete_statement says
+    the text up to it is complete, so semicolons inside quotes are left alone.
+    Text after the last complete statement is kept as a statement of its own,
+    so running it raises the error instead of it being dropped.
+
+    Args:
+        script (str): sql script with one or more statements.
+
+    Returns:
+        list: Statements, with the line number each one starts on.
+    """
+    statements = []
+    start = 0
+    end = script.find(";")
+    while end != -1:
+        if sqlite3.complete_statement(script[start:end + 1]):
+            statements.append(script_statement(script, start, end + 1))
+            start = end + 1
+        end = script.find(";", end + 1)
+    statements.append(script_statement(script, start, len(script)))
+    return [statement for statement in statements if statement is not None]
+
+
+def script_statement(script: str, start: int, end: int) -> Statement | None:
+    """Make a Statement from script[start:end], None if there is no sql in it."""
+    text = script[start:end]
+    if is_comment_only(text.rstrip().removesuffix(";")):
+        return None
+    offset = start + len(text) - len(text.lstrip())
+    return Statement(script.count("\n", 0, offset) + 1, text.strip())
+
+
+def transaction_keyword(statement: Statement) -> str | None:
+    """The keyword if the statement starts or ends a transaction, ie. "BEGIN", else None."""
+    lines = [line for line in statement.sql.splitlines() if not line.strip().startswith("--")]
+    words = re.findall(r"\w+", " ".join(lines), re.ASCII)
+    keyword = words[0].upper() if words else None
+    return keyword if keyword in TRANSACTION_KEYWORDS else None
+
+
+def transaction_errors(statements: list) -> list:
+    """A ScriptError for each statement that starts or ends a transaction."""
+    return [
+        ScriptError(statement.line, TRANSACTION_MESSAGE.format(keyword=keyword))
+        for statement in statements
+        if (keyword := transaction_keyword(statement))
+    ]
+
+
+def run_statements(
+    connection: sqlite3.Connection, statements: list, progress=None, cancel=None
+) -> list:
+    """Run the statements in one transaction, timing each one.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        statements (list): Statements from split_statements.
+        progress (callable, optional): called with the number of rows changed so far.
+        cancel (threading.Event, optional): when set the statements stop and the
+            transaction is rolled back.
+
+    Raises:
+        CommitCancelled: if cancel was set before the transaction was committed.
+        sqlite3.OperationalError: if a statement starts or ends a transaction,
+            nothing is run.
+
+    Returns:
+        list: a StatementReport for each statement.
+    """
+    # A COMMIT part way through would keep half the script, so none of it runs.
+    if errors := transaction_errors(statements):
+        raise sqlite3.OperationalError(format_errors(errors))
+    report = []
+    rows_changed = 0
+    with transaction(connection):
+        for number, statement in enumerate(statements, start=1):
+            if cancel is not None and cancel.is_set():
+                raise CommitCancelled
+            start = time.perf_counter()
+            rows = max(connection.execute(statement.sql).rowcount, 0)
+            milliseconds = (time.perf_counter() - start) * 1000
+            report.append(StatementReport(number, statement.line, rows, milliseconds))
+            rows_changed += rows
+            if progress is not None:
+                progress(rows_changed)
+        if cancel is not None and cancel.is_set():
+            raise CommitCancelled
+    return report
+
+
+def upsert_statement(statement: Statement) -> Statement:
+    """Add the upsert clause to an INSERT INTO catalog_song statement that doesn't have one."""
+    sql = statement.sql.rstrip().removesuffix(";").rstrip()
+    if not sql.upper().startswith(SCRIPT_HEADER.upper()) or "ON CONFLICT" in sql.upper():
+        return statement
+    return statement._replace(sql=sql + UPSERT_CLAUSE + ";")
+
+
+def run_script(
+    connection: sqlite3.Connection, script: str, progress=None, cancel=None, upsert: bool = False
+) -> list:
+    """Split the script into statements and run them all in one transaction.
+
+    Args:
+        connection (sqlite3.Connection): connection to database.
+        script (str): sql script with one or more statements.
+        progress (callable, optional): called with the number of rows changed so far.
+        cancel (threading.Event, optional): when set the script stops and is rolled back.
+        upsert (bool, optional): True makes the INSERT INTO catalog_song statements
+            update songs that are already there. Defaults to False.
+
+    Returns:
+        list: a StatementReport for each statement, rows is the rows changed.
+    """
+    statements = split_statements(script)
+    if upsert:
+        statements = [upsert_statement(statement) for statement in statements]
+    return run_statements(connection, statements, progress, cancel)
+
+
+def dry_run(connection: sqlite3.Connection, script: str) -> list:
+    """Run the script and roll it back, to find the statements that would fail.
+
+    Every statement is tried, so all the errors are found in one go.
+    Statements that start or end a transaction aren't run, they're errors.
+
+    Args:
+        connection (sqlite3.Connection): connection to run the script on,
+            ie. an in memory copy of the tables.
+        script (str): sql script to check.
+
+    Returns:
+        list: a ScriptError for each statement that failed, empty if none did.
+    """
+    statements = split_statements(script)
+    errors = transaction_errors(statements)
+    connection.execute("BEGIN")
+    try:
+        for statement in statements:
+            if transaction_keyword(statement):
+                continue
+            try:
+                connection.execute(statement.sql)
+            except sqlite3.Error as error:
+                errors.append(ScriptError(statement.line, str(error)))
+    finally:
+        connection.rollback()
+    return errors
+
+
+def format_errors(errors: list, limit: int = 5) -> str:
+    """Make the dry run errors readable, ie. "Line 4: no such column: song_titl".
+
+    Args:
+        errors (list): ScriptErrors from dry_run.
+        limit (int, optional): most errors to list. Defaults to 5.
+
+    Returns:
+        str: one line for each error.
+    """
+    lines = [f"Line {error.line}: {error.message}" for error in errors[:limit]]
+    if len(errors) > limit:
+        lines.append(f"... and {len(errors) - limit} more.")
+    return "\n".join(lines)
+
+
+def format_report(report: list, limit: int = 5) -> str:
+    """Make the statement report readable, slowest statements first.
+
+    Args:
+        report (list): StatementReports from run_statements.
+        limit (int, optional): most statements to list. Defaults to 5.
+
+    Returns:
+        str: one line for each of the slowest statements.
+    """
+    total = sum(statement.milliseconds for statement in report)
+    lines = [f"{len(report)} statements in {total:.1f} ms, slowest:"]
+    slowest = sorted(report, key=lambda statement: statement.milliseconds, reverse=True)
+    lines.extend(
+        f"  #{statement.number} (line {statement.line}): "
+        f"{statement.rows} rows, {statement.milliseconds:.1f} ms"
+        for statement in slowest[:limit]
+    )
+    return "\n".join(lines)
+
+
+# A value in a row of the script, 'single' or "double" quoted with the quote
+# doubled inside, or a whole number.
+VALUE_PATTERN = r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|-?\d+"""
+ROW_PATTERN = re.compile(
+    rf"""^\s*\(\s*({VALUE_PATTERN})\s*,\s*({VALUE_PATTERN})\s*,\s*({VALUE_PATTERN})\s*\)\s*([,;]?)\s*$"""
+)
+
+
+def parse_value(text: str) -> int | str:
+    """Turn an sql literal from a row back into a value, unquoted numbers become ints.
+
+    Quoted values stay strings, so a title like '007' comes back as it was.
+    """
+    if text[0] in "'\"":
+        return text[1:-1].replace(text[0] * 2, text[0])
+    digits = text.removeprefix("-")
+    return int(text) if digits.isascii() and digits.isdecimal() else text
+
+
+def parse_song_row(line: str) -> tuple | None:
+    """Parse one line of the VALUES part of a script.
+
+    Args:
+        line (str): line like " ('Song', 1, 10),"
+
+    Returns:
+        tuple: (SongRow, ending) where ending is ",", ";" or "",
+            or None if the line isn't a whole row.
+    """
+    if (match := ROW_PATTERN.match(line)) is None:
+        return None
+    song_title, song_number, album_id, ending = match.groups()
+    song_title = parse_value(song_title)
+    album_id = parse_value(album_id)
+    if isinstance(album_id, str) and album_id.isascii() and album_id.isdecimal():
+        # A quoted album id still goes into the integer column.
+        album_id = int(album_id)
+    if not isinstance(album_id, int):
+        return None
+    return SongRow(str(song_title), parse_value(song_number), album_id), ending
+
+
+def parse_script(text: str) -> tuple:
+    """Get the albums back out of a script made by this app, even an unfinished one.
+
+    Each INSERT statement in the script is one album. Reading stops at the
+    first line that isn't a header or a whole row, so a line that was only
+    half written is left out.
+
+    Args:
+        text (str): the script.
+
+    Returns:
+        tuple: (list with a list of SongRows for each album,
+            True if the last album was closed with the semicolon).
+    """
+    albums = []
+    closed = True
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        if closed:
+            # Between albums only the start of the next statement is expected.
+            if not stripped.startswith("INSERT INTO"):
+                break
+            albums.append([])
+            closed = False
+            continue
+        if stripped == "VALUES" and not albums[-1]:
+            continue
+        if (parsed := parse_song_row(line)) is None:
+            break
+        row, ending = parsed
+        albums[-1].append(row)
+        closed = ending == ";"
+    return albums, closed and bool(albums)
+
+
+# Splits a row into its fields on the commas outside quotes.
+FIELD_PATTERN = re.compile(r"""'(?:[^']|'')*'?|"(?:[^"]|"")*"?|[^,'"]+""")
+
+
+@lru_cache(maxsize=8192)
+def check_row_line(line: str) -> tuple:
+    """Parse a line of the script that should be a row, and say what's wrong with it.
+
+    Cached by the line's text, so lines that didn't change aren't parsed again.
+
+    Args:
+        line (str): line that starts with "(".
+
+    Returns:
+        tuple: (SongRow, ending) if the row is whole, otherwise (None, problem).
+    """
+    if (parsed := parse_song_row(line)) is not None:
+        return parsed
+    body = line.strip()
+    if body.count("'") % 2 or body.count('"') % 2:
+        return None, "Unclosed quote."
+    if not body.endswith((")", "),", ");")):
+        return None, "Row doesn't end with ), or );"
+    inside = body[1:body.rindex(")")]
+    fields = [field for field in FIELD_PATTERN.findall(inside) if field.strip()]
+    if len(fields) != 3:
+        return None, f"{len(fields)} fields, a row has 3: title, number, album id."
+    return None, "The song number or album id isn't a number."
+
+
+def check_sequence(previous: tuple | None, current: tuple) -> str | None:
+    """Check a row follows on from the row before it in the same statement.
+
+    Args:
+        previous (tuple): (SongRow, ending) of the row before, None if there isn't one.
+        current (tuple): (SongRow, ending) of the row.
+
+    Returns:
+        str: the problem, None if the row follows on.
+    """
+    if previous is None or previous[0] is None or previous[1] == ";":
+        # First row of a statement, it can start anywhere.
+        return None
+    row, previous_row = current[0], previous[0]
+    if row.album_id != previous_row.album_id:
+        return f"Album id {row.album_id}, the row before is {previous_row.album_id}."
+    try:
+        side, number = split_song_number(row.song_number)
+        previous_side, previous_number = split_song_number(previous_row.song_number)
+    except ValueError:
+        return f"Song number {row.song_number!r} isn't like 3 or A-3."
+    expected = previous_number + 1 if side == previous_side else 1
+    if number != expected:
+        return f"Song number {row.song_number}, expected {expected if not side else f'{side}-{expected}'}."
+    return None
+
+
+class ScriptValidator:
+    """Checks the rows of a script as it's edited, a line at a time.
+
+    Only the lines that changed are parsed again, and only they and the row
+    after them are checked for the song number sequence. problems has the
+    message for each line that has one, by 0 based line number.
+    """
+
+    def __init__(self) -> None:
+        self.lines = []
+        self.parsed = []  # (SongRow, ending) or (None, problem) for rows, None for other lines.
+        self.problems = {}
+
+    def load(self, text: str) -> None:
+        """Check the whole script."""
+        self.lines = []
+        self.parsed = []
+        self.problems = {}
+        self.update(text)
+
+    def parse(self, line: str) -> tuple | None:
+        return check_row_line(line) if line.lstrip().startswith("(") else None
+
+    def row_before(self, index: int) -> tuple | None:
+        """The parsed row nearest before index, stopping at the statement's header."""
+        for before in range(index - 1, -1, -1):
+            if self.parsed[before] is not None:
+                return self.parsed[before]
+            if self.lines[before].strip() not in ("", "VALUES"):
+                return None
+        return None
+
+    def check(self, index: int) -> None:
+        """Set or clear the problem for the line at index."""
+        parsed = self.parsed[index]
+        problem = None
+        if parsed is not None:
+            if parsed[0] is None:
+                problem = parsed[1]
+            elif not parsed[1]:
+                problem = "Missing the comma, or the semicolon after the last row."
+            else:
+                problem = check_sequence(self.row_before(index), parsed)
+        if problem:
+            self.problems[index] = problem
+        else:
+            self.problems.pop(index, None)
+
+    def next_row(self, index: int) -> int | None:
+        for after in range(index + 1, len(self.lines)):
+            if self.parsed[after] is not None:
+                return after
+            if self.lines[after].strip() not in ("", "VALUES"):
+                return None
+        return None
+
+    def update_line(self, index: int, line: str) -> list:
+        """A line was edited without adding or removing lines.
+
+        Args:
+            index (int): 0 based line number.
+            line (str): its new text.
+
+        Returns:
+            list: the line numbers whose problem may have changed.
+        """
+        if index >= len(self.lines) or self.lines[index] == line:
+            return []
+        self.lines[index] = line
+        self.parsed[index] = self.parse(line)
+        changed = [index]
+        if (after := self.next_row(index)) is not None:
+            changed.append(after)
+        for changed_index in changed:
+            self.check(changed_index)
+        return changed
+
+    def update(self, text: str) -> None:
+        """Lines were added, removed or changed anywhere, ie. after a paste.
+
+        Only the lines between the unchanged start and end of the script are
+        parsed again, the problems after them move with their lines.
+        """
+        lines = text.split("\n")
+        old = self.lines
+        start = 0
+        shortest = min(len(lines), len(old))
+        while start < shortest and lines[start] == old[start]:
+            start += 1
+        end = 0
+        while end < shortest - start and lines[-1 - end] == old[-1 - end]:
+            end += 1
+        shift = len(lines) - len(old)
+        new_middle = [self.parse(line) for line in lines[start:len(lines) - end]]
+        self.parsed[start:len(old) - end] = new_middle
+        self.lines = lines
+        self.problems = {
+            index if index < start else index + shift: problem
+            for index, problem in self.problems.items()
+            if index < start or index >= len(old) - end
+        }
+        # The changed lines, and the first row after them for its sequence.
+        last = len(lines) - end
+        for index in range(start, last):
+            self.check(index)
+        if (after := self.next_row(max(last - 1, 0))) is not None and after >= last:
+            self.check(after)
+
+
+class ScriptWriter:
+    """Buffered file for the script, kept open while the script is being made.
+
+    Rows are written through one open file instead of opening and closing it
+    for each row. Each write is flushed to the OS, so the rows survive the app
+    crashing, but it's only synced to disk at checkpoints, the last song,
+    save and commit.
+    """
+
+    def __init__(self, filename: Path) -> None:
+        self.filename = Path(filename).resolve()
+        self.file = open(self.filename, "w", buffering=1 << 16)
+
+    def write(self, text: str) -> None:
+        self.file.write(text)
+        self.file.flush()
+
+    def checkpoint(self) -> None:
+        """Flush what's been written and make sure it's on the disk."""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def rewrite(self, text: str) -> None:
+        """Replace everything in the file with text, ie. after an undo."""
+        self.file.seek(0)
+        self.file.write(text)
+        self.file.truncate()
+        self.file.flush()
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.checkpoint()
+            self.file.close()
+
+
+class SessionQueue:
+    """Albums finished this session that are waiting to be committed.
+
+    Each album is its own list of rows and its own INSERT statement in the
+    script, the whole queue is committed together.
+    """
+
+    def __init__(self) -> None:
+        self.albums = []
+
+    def __len__(self) -> int:
+        return len(self.albums)
+
+    def clear(self) -> None:
+        self.albums.clear()
+
+    def add_album(self, rows: list) -> None:
+        """Queue an album, rows is copied."""
+        self.albums.append(list(rows))
+
+    def row_count(self) -> int:
+        return sum(len(album) for album in self.albums)
+
+    def text(self) -> str:
+        """Returns the script for the queued albums, one statement each."""
+        return "\n\n".join(create_script_text(album) for album in self.albums)
+
+
+class RowStore:
+    """Rows of the album being entered, kept in columns instead of a tuple per row.
+
+    Each row has a slot. Deleting a row only marks its slot, so the slots of
+    the other rows never move and every change can be undone in O(1).
+    The dead slots are dropped by compact(), when there's nothing left to undo.
+    """
+
+    __slots__ = ("titles", "numbers", "album_ids", "live", "count")
+
+    def __init__(self, rows: Iterable = ()) -> None:
+        self.titles = []
+        self.numbers = []  # ints, or "A-1" style strings for LPs.
+        self.album_ids = array("q")
+        self.live = bytearray()
+        self.count = 0
+        self.extend(rows)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __bool__(self) -> bool:
+        return self.count > 0
+
+    def __iter__(self) -> Iterator[SongRow]:
+        for slot, live in enumerate(self.live):
+            if live:
+                yield self.row(slot)
+
+    def row(self, slot: int) -> SongRow:
+        return SongRow(self.titles[slot], self.numbers[slot], self.album_ids[slot])
+
+    def last_slot(self) -> int | None:
+        """Slot of the last row that hasn't been deleted, None if there isn't one."""
+        for slot in range(len(self.live) - 1, -1, -1):
+            if self.live[slot]:
+                return slot
+        return None
+
+    def last(self) -> SongRow | None:
+        slot = self.last_slot()
+        return None if slot is None else self.row(slot)
+
+    def append(self, row: SongRow) -> int:
+        """Add a row in a new slot, returns the slot."""
+        song_title, song_number, album_id = row
+        # Titles repeat a lot across albums, interning keeps one copy of each.
+        self.titles.append(sys.intern(song_title))
+        self.numbers.append(song_number)
+        self.album_ids.append(album_id)
+        self.live.append(1)
+        self.count += 1
+        return len(self.live) - 1
+
+    def extend(self, rows: Iterable) -> None:
+        for row in rows:
+            self.append(row)
+
+    def pop(self) -> SongRow:
+        """Remove the last slot and return its row, for undoing an append."""
+        row = self.row(len(self.live) - 1)
+        self.count -= self.live.pop()
+        self.titles.pop()
+        self.numbers.pop()
+        self.album_ids.pop()
+        return row
+
+    def replace(self, slot: int, row: SongRow) -> SongRow:
+        """Put row in slot, returns the row that was there."""
+        old_row = self.row(slot)
+        self.titles[slot] = sys.intern(row[0])
+        self.numbers[slot] = row[1]
+        self.album_ids[slot] = row[2]
+        return old_row
+
+    def set_live(self, slot: int, live: bool) -> None:
+        """Delete or restore the row in slot."""
+        self.count += int(live) - self.live[slot]
+        self.live[slot] = int(live)
+
+    def compact(self) -> None:
+        """Drop the deleted rows, this moves the slots of the rows after them."""
+        if self.count != len(self.live):
+            rows = list(self)
+            self.clear()
+            self.extend(rows)
+
+    def clear(self) -> None:
+        self.titles.clear()
+        del self.album_ids[:]
+        self.numbers.clear()
+        self.live.clear()
+        self.count = 0
+
+
+class RowOperation:
+    """One change to a RowStore, as kept in the undo and redo history.
+
+    kind is "add", "edit" or "delete". row is only kept when the store no
+    longer has it: the row that was replaced by an edit, or an undone add.
+    """
+
+    __slots__ = ("kind", "slot", "row", "closed_before", "closed_after")
+
+    def __init__(self, kind: str, slot: int, row=None, closed_before=False, closed_after=False):
+        self.kind = kind
+        self.slot = slot
+        self.row = row
+        self.closed_before = closed_before
+        self.closed_after = closed_after
+
+
+class ScriptBuffer:
+    """In memory script for the session, the queued albums and the album being entered.
+
+    The rows are the source of truth, the text is made from them when it is
+    needed and kept until the rows change. After open_file() each row is also
+    written through a ScriptWriter, which is synced to the disk at checkpoints.
+    Adding, editing and deleting rows of the album being entered can be undone
+    and redone, up to history changes back. If journal is set, every change
+    is recorded in it too, see scripter_journal.
+    """
+
+    def __init__(self, history: int = 1000) -> None:
+        """
+        Args:
+            history (int, optional): most changes kept for undo. Defaults to 1000.
+        """
+        self.queue = SessionQueue()
+        self.rows = RowStore()
+        self.closed = False
+        self.writer = None
+        self.undo_log = deque(maxlen=history)
+        self.redo_log = deque(maxlen=history)
+        self._text = None
+        self.journal = None
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def clear(self) -> None:
+        """Start a new, empty script, the file is closed."""
+        self.close_file()
+        self.queue.clear()
+        self.rows.clear()
+        self.closed = False
+        self.clear_history()
+        self.record("clear")
+
+    def load(self, albums: list, closed: bool = False) -> None:
+        """Start the script over with albums, ie. recovered from a script file.
+
+        Args:
+            albums (list): a list of SongRows for each album, the last one is
+                the album being entered.
+            closed (bool, optional): True if the last album is finished.
+        """
+        self.clear()
+        for album in albums[:-1]:
+            self.queue.add_album(album)
+        if albums:
+            self.rows.extend(albums[-1])
+        self.closed = closed
+        self._text = None
+        self.record("load", albums=albums, closed=closed)
+
+    def open_file(self, filename: Path) -> None:
+        """Write the script so far to filename and keep it open for the rows to come.
+
+        Args:
+            filename (pathlib.Path): Path to the .sql file.
+        """
+        self.close_file()
+        self.writer = ScriptWriter(filename)
+        self.writer.write(self.text())
+
+    def checkpoint(self) -> None:
+        """Make sure the script file, and the journal, are all on the disk."""
+        if self.writer is not None:
+            self.writer.checkpoint()
+        if self.journal is not None:
+            self.journal.sync()
+
+    def close_file(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def add_row(self, row: SongRow, last: bool = False) -> str:
+        """Add a row to the album being entered.
+
+        Args:
+            row (SongRow): row to add.
+            last (bool, optional): True if this is the last row of the album.
+                Defaults to False.
+
+        Returns:
+            str: the formatted line for the row, to append to the -SCRIPT- element.
+        """
+        slot = self.rows.append(row)
+        self.log(RowOperation("add", slot, None, self.closed, last))
+        self.record("add", row=row, last=last)
+        self.closed = last
+        return self.write(format_song_row(row, last))
+
+    def edit_row(self, slot: int, row: SongRow) -> None:
+        """Replace the row in slot, ie. to fix a typo in a title."""
+        old_row = self.rows.replace(slot, row)
+        self.log(RowOperation("edit", slot, old_row, self.closed, self.closed))
+        self.record("edit", slot=slot, row=row)
+        self.rows_changed()
+
+    def fix_rows(self, fixes: list) -> None:
+        """Replace rows the app made, ie. when a scan finds a second disc, all at once.
+
+        Unlike edit_row() the fixes aren't kept for undo, they're journaled
+        together and the file is written out once.
+
+        Args:
+            fixes (list): (slot, SongRow) for each row to replace.
+        """
+        if not fixes:
+            return
+        for slot, row in fixes:
+            self.rows.replace(slot, row)
+        self.record("fix", rows=[[slot, row] for slot, row in fixes])
+        self.rows_changed()
+
+    def delete_row(self, slot: int) -> None:
+        """Delete the row in slot."""
+        self.rows.set_live(slot, False)
+        self.log(RowOperation("delete", slot, None, self.closed, self.closed))
+        self.record("delete", slot=slot)
+        self.rows_changed()
+
+    def record(self, op: str, **fields) -> None:
+        """Record a change in the journal, if there is one."""
+        if self.journal is not None:
+            self.journal.record(op, **fields)
+
+    def log(self, operation: RowOperation) -> None:
+        """Keep a change for undo, a new change means there's nothing to redo."""
+        self.undo_log.append(operation)
+        self.redo_log.clear()
+        self._text = None
+
+    def clear_history(self) -> None:
+        """Forget the changes, and drop any deleted rows now they can't come back."""
+        self.undo_log.clear()
+        self.redo_log.clear()
+        self.rows.compact()
+        self._text = None
+
+    @property
+    def can_undo(self) -> bool:
+        return bool(self.undo_log)
+
+    @property
+    def can_redo(self) -> bool:
+        return bool(self.redo_log)
+
+    def undo(self) -> bool:
+        """Undo the last change to the rows, returns False if there's nothing to undo."""
+        if not self.undo_log:
+            return False
+        operation = self.undo_log.pop()
+        if operation.kind == "add":
+            # Changes are undone last first, so an added row is always in the last slot.
+            operation.row = self.rows.pop()
+        elif operation.kind == "edit":
+            operation.row = self.rows.replace(operation.slot, operation.row)
+        else:
+            self.rows.set_live(operation.slot, True)
+        self.closed = operation.closed_before
+        self.redo_log.append(operation)
+        self.rows_changed()
+        self.record("undo")
+        return True
+
+    def redo(self) -> bool:
+        """Do the last undone change again, returns False if there's nothing to redo."""
+        if not self.redo_log:
+            return False
+        operation = self.redo_log.pop()
+        if operation.kind == "add":
+            self.rows.append(operation.row)
+            operation.row = None
+        elif operation.kind == "edit":
+            operation.row = self.rows.replace(operation.slot, operation.row)
+        else:
+            self.rows.set_live(operation.slot, False)
+        self.closed = operation.closed_after
+        self.undo_log.append(operation)
+        self.rows_changed()
+        self.record("redo")
+        return True
+
+    def rows_changed(self) -> None:
+        """The rows changed somewhere before the end, the file is written out again."""
+        self._text = None
+        if self.writer is not None:
+            self.writer.rewrite(self.text())
+
+    def next_album(self) -> str:
+        """Queue the finished album and start the statement for the next one.
+
+        Returns:
+            str: the text to append to the -SCRIPT- element.
+        """
+        self.queue.add_album(self.rows)
+        self.rows.clear()
+        self.closed = False
+        # The queued album can't be changed, so its history goes too.
+        self.clear_history()
+        self.record("next_album")
+        if self.journal is not None:
+            # With no history to keep, it's a good time to compact the journal.
+            self.journal.compact(self)
+        return self.write(f"\n\n{script_header()}")
+
+    def write(self, text: str) -> str:
+        """Write text through to the open file, if there is one, and return it."""
+        if self.writer is not None:
+            self.writer.write(text)
+        return text
+
+    def albums(self) -> list:
+        """Returns a list of rows for each album, the queued ones and the one being entered."""
+        albums = list(self.queue.albums)
+        if self.rows:
+            albums.append(list(self.rows))
+        return albums
+
+    def text(self) -> str:
+        """Returns the whole script, each album closed with a semicolon after its last row.
+
+        The text is only made again after the rows have changed.
+        """
+        if self._text is None:
+            self._text = self.make_text()
+        return self._text
+
+    def make_text(self) -> str:
+        if self.closed:
+            album = create_script_text(self.rows)
+        else:
+            album = script_header() + "".join(format_song_row(row) for row in self.rows)
+        if not self.queue:
+            return album
+        return f"{self.queue.text()}\n\n{album}"
+
+    def save(self, filename: Path) -> None:
+        """Write the script to a .sql file, if it's the open file just checkpoint it.
+
+        Args:
+            filename (pathlib.Path): Path to the .sql file.
+        """
+        if self.writer is not None and self.writer.filename == Path(filename).resolve():
+            self.checkpoint()
+            return
+        with open(filename, "w") as file:
+            file.write(self.text())
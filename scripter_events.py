@@ -0,0 +1,74 @@
+"""
+Keeps the typing in sql_scripter's inputs from running the whole event loop on every key.
+Events from the inputs are held back until the input has been quiet for a moment,
+so a burst of typing is handled once, with what was typed by the end of it.
+Key presses that nothing handles are dropped before they get to the loop's handlers.
+oktl
+"""
+import re
+import time
+
+# What tk sends for a key press when the window returns keyboard events,
+# ie. "a" or "BackSpace:8".
+KEY_EVENT_PATTERN = re.compile(r"^(?:.|\w+:\d+)$", re.DOTALL)
+
+
+def is_key_event(event) -> bool:
+    """True if the event is a key press, not an element's or a binding's event."""
+    return isinstance(event, str) and KEY_EVENT_PATTERN.match(event) is not None
+
+
+class Debouncer:
+    """Holds back events from inputs until they've been quiet for their delay.
+
+    hold() takes the event if it's one to hold back, starting its delay
+    over if it's already waiting, so repeated events become one. The loop
+    reads the window with timeout() and handles what due() returns.
+    Before any other event, flush() hands over everything still waiting,
+    so the other handlers see the inputs as they are now.
+    """
+
+    def __init__(self, delays: dict, clock=time.monotonic) -> None:
+        """
+        Args:
+            delays (dict): event: seconds to wait, 0 isn't held back.
+            clock (callable, optional): the time in seconds. Defaults to time.monotonic.
+        """
+        self.delays = delays
+        self.clock = clock
+        self.waiting = {}  # event: when it's due.
+
+    def hold(self, event) -> bool:
+        """Hold the event back if it's one of the inputs.
+
+        Returns:
+            bool: True if it was held, the loop should carry on to the next read.
+        """
+        if not self.delays.get(event):
+            return False
+        self.waiting[event] = self.clock() + self.delays[event]
+        return True
+
+    def timeout(self) -> int | None:
+        """Milliseconds to wait for the next event, None to wait as long as it takes."""
+        if not self.waiting:
+            return None
+        return max(0, round((min(self.waiting.values()) - self.clock()) * 1000))
+
+    def due(self) -> list:
+        """The events whose delay is over, they're not waiting any more."""
+        now = self.clock()
+        events = [event for event, due in self.waiting.items() if due <= now]
+        for event in events:
+            del self.waiting[event]
+        return events
+
+    def flush(self) -> list:
+        """All the events still waiting, whether they're due or not."""
+        events = list(self.waiting)
+        self.waiting.clear()
+        return events
+
+    def cancel(self, event) -> None:
+        """Forget the event if it's waiting."""
+        self.waiting.pop(event, None)
@@ -2,15 +2,42 @@
 Helper functions for sql_scipter gui
 oktl 14 Aug 2023
 """
+from __future__ import annotations
+
 import datetime
-import webbrowser
+import importlib
 from pathlib import Path
 
-import PySimpleGUI as sg
 
-# declare some sg aliases
-B = sg.Button
-T = sg.Text
+class LazyModule:
+    """Stand in for a module that is only imported when one of its attributes is used.
+
+    Keeps PySimpleGUI and Tk from loading when only the helpers are needed.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.module_name = name
+        self.module = None
+
+    def __getattr__(self, attribute: str):
+        if self.module is None:
+            self.module = importlib.import_module(self.module_name)
+        return getattr(self.module, attribute)
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Import a module the first time one of its attributes is used.
+
+    Args:
+        name (str): name of the module to import.
+
+    Returns:
+        LazyModule: the module, loaded on first use.
+    """
+    return LazyModule(name)
+
+
+sg = lazy_import("PySimpleGUI")
 
 
 def check_inputs(values: dict) -> str:
@@ -71,6 +98,8 @@ def open_file_in_browser(filename: Path) -> None:
     """
     # file_to_open = Path(filename)
     # webbrowser.open_new(file_to_open)
+    import webbrowser  # Only needed here, it's slow to import.
+
     webbrowser.open_new(filename)
     
 
@@ -137,6 +166,7 @@ def delete_popup(title: str, text: str, filename: Path) -> None:
         text (str): text to show in PySimpleGUI Text element.
         filename (pathlib.Path): Path to filename to delete.
     """
+    T = sg.Text
     window = sg.Window(
         title,
         [
@@ -202,7 +232,7 @@ def action_buttons_frame(title: str) -> sg.Frame:
     Returns:
         sg.Frame: PySimpleGUI Frame element with Button elements.
     """
-    
+    B = sg.Button
     buttons = [
         [
             B("Copy script", 
@@ -214,6 +244,18 @@ def action_buttons_frame(title: str) -> sg.Frame:
                 pad=((40, 0), (20, 20)),
                 key="Commit script",
                 ),
+            B("Cancel commit",
+                visible=False,
+                pad=((40, 0), (20, 20)),
+                key="Cancel commit",
+                ),
+            sg.Checkbox("Update existing",
+                default=False,
+                pad=((20, 0), (20, 20)),
+                tooltip=" Songs already on the album, by song number, get the new title \n"
+                    " instead of being added again. Needs Actions > Create song index. ",
+                key="-CB-UPSERT-",
+                ),
             B("Clear inputs",
                 pad=((40, 40), (20, 20)),
                 ),
@@ -242,6 +284,7 @@ def open_about_window(title: str, text_file) -> None:
         title (str): title for the window
         text_file (_type_) ?:
     """
+    B, T = sg.Button, sg.Text
     layout = [
         [sg.Image("add32.png"), T(title, font="Calibri 12 bold")],
         [T(text_file, 
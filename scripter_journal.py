@@ -0,0 +1,215 @@
+"""
+Session journal for sql_scripter, so a session can be carried on after a crash.
+Every change to the script's rows is appended to the journal as a line of JSON.
+Each line is flushed straight away, so it survives the app dying, and synced
+to the disk every few lines, so a crash of the whole computer loses at most those.
+
+Between albums the journal is compacted, rewritten as one snapshot of the
+rows so far, so replaying it on the next launch stays quick however long
+the session was.
+oktl
+"""
+import json
+import os
+import time
+from pathlib import Path
+
+import scripter_engine as se
+
+
+class SessionJournal:
+    """Append only log of the changes to a se.ScriptBuffer.
+
+    Set it as the buffer's journal, the buffer records its own changes.
+    start() begins a new journal for a script, discard() removes it
+    once the session doesn't need carrying on.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        sync_every: int = 20,
+        sync_seconds: float = 1.0,
+        compact_every: int = 1000,
+    ) -> None:
+        """
+        Args:
+            path (pathlib.Path): the journal file.
+            sync_every (int, optional): lines between syncs to the disk. Defaults to 20.
+            sync_seconds (float, optional): most seconds between syncs. Defaults to 1.
+            compact_every (int, optional): lines before the journal is compacted,
+                at the next album. Defaults to 1000.
+        """
+        self.path = Path(path)
+        self.sync_every = sync_every
+        self.sync_seconds = sync_seconds
+        self.compact_every = compact_every
+        self.file = None
+        self.script_name = None
+        self.inputs = {}
+        self.unsynced = 0
+        self.synced_at = time.monotonic()
+        self.since_compact = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.file is not None
+
+    def start(self, script_name: Path, buffer: se.ScriptBuffer = None) -> None:
+        """Start a new journal for the script, replacing the old one.
+
+        Args:
+            script_name (pathlib.Path): the script the rows are written to.
+            buffer (se.ScriptBuffer, optional): rows the script already has,
+                ie. after a resume. Defaults to none.
+        """
+        self.close()
+        self.script_name = str(Path(script_name).resolve())
+        self.write_snapshot(buffer)
+
+    def write_snapshot(self, buffer: se.ScriptBuffer = None) -> None:
+        """Write the journal again as one snapshot of the buffer, then carry on appending.
+
+        The new journal is written to a temporary file and moved over the old one,
+        so there's always a whole journal on the disk.
+        """
+        temporary = self.path.with_suffix(".tmp")
+        with open(temporary, "w", encoding="utf-8") as file:
+            file.write(self.line("start", script=self.script_name))
+            if buffer is not None and (buffer.queue or buffer.rows):
+                # The album being entered goes last, even if it's empty so far.
+                albums = [*buffer.queue.albums, list(buffer.rows)]
+                file.write(self.line("load", albums=albums, closed=buffer.closed))
+            if self.inputs:
+                file.write(self.line("inputs", **self.inputs))
+            file.flush()
+            os.fsync(file.fileno())
+        if self.file is not None:
+            self.file.close()
+        os.replace(temporary, self.path)
+        self.file = open(self.path, "a", encoding="utf-8")
+        self.unsynced = 0
+        self.since_compact = 0
+        self.synced_at = time.monotonic()
+
+    @staticmethod
+    def line(op: str, **fields) -> str:
+        return json.dumps({"op": op, **fields}, separators=(",", ":")) + "\n"
+
+    def record(self, op: str, **fields) -> None:
+        """Append a change, ie. record("add", row=row, last=False).
+
+        Rows are written as [song_title, song_number, album_id].
+        """
+        if self.file is None:
+            return
+        self.file.write(self.line(op, **fields))
+        # Flushed to the OS every time, synced to the disk in batches.
+        self.file.flush()
+        self.unsynced += 1
+        self.since_compact += 1
+        if (
+            self.unsynced >= self.sync_every
+            or time.monotonic() - self.synced_at > self.sync_seconds
+        ):
+            self.sync()
+
+    def note_inputs(self, **inputs) -> None:
+        """Record the inputs that aren't in the rows, ie. the # of songs, when they change."""
+        if inputs != self.inputs:
+            self.inputs = inputs
+            self.record("inputs", **inputs)
+
+    def sync(self) -> None:
+        """Make sure everything recorded is on the disk."""
+        if self.file is not None and self.unsynced:
+            os.fsync(self.file.fileno())
+            self.unsynced = 0
+        self.synced_at = time.monotonic()
+
+    def compact(self, buffer: se.ScriptBuffer) -> None:
+        """Snapshot the buffer if enough has been recorded since the last snapshot.
+
+        Only called between albums, when there's no undo history to keep.
+        """
+        if self.file is not None and self.since_compact >= self.compact_every:
+            self.write_snapshot(buffer)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.sync()
+            self.file.close()
+            self.file = None
+
+    def discard(self) -> None:
+        """Close and remove the journal, the session is done with."""
+        self.close()
+        self.inputs = {}
+        self.path.unlink(missing_ok=True)
+
+
+def apply_record(buffer: se.ScriptBuffer, op: str, record: dict) -> None:
+    """Make one recorded change to the buffer again."""
+    if op == "add":
+        buffer.add_row(se.SongRow(*record["row"]), record["last"])
+    elif op == "edit":
+        buffer.edit_row(record["slot"], se.SongRow(*record["row"]))
+    elif op == "fix":
+        buffer.fix_rows([(slot, se.SongRow(*row)) for slot, row in record["rows"]])
+    elif op == "delete":
+        buffer.delete_row(record["slot"])
+    elif op == "undo":
+        buffer.undo()
+    elif op == "redo":
+        buffer.redo()
+    elif op == "next_album":
+        buffer.next_album()
+    elif op == "load":
+        albums = [[se.SongRow(*row) for row in album] for album in record["albums"]]
+        buffer.load(albums, record["closed"])
+    elif op == "clear":
+        buffer.clear()
+
+
+def replay(path: Path, buffer: se.ScriptBuffer) -> dict | None:
+    """Rebuild the rows of an unfinished session from its journal.
+
+    Args:
+        path (pathlib.Path): the journal file.
+        buffer (se.ScriptBuffer): buffer to rebuild the rows in, it's cleared first.
+
+    Returns:
+        dict: {"script": script file, "inputs": last inputs recorded},
+            None if there's no journal to carry on from. If the journal
+            doesn't fit the rows it rebuilds, it's removed and the dict has
+            "error" instead of a script, the buffer is left empty.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+    session = {"script": None, "inputs": {}}
+    journal, buffer.journal = buffer.journal, None
+    try:
+        buffer.clear()
+        with open(path, encoding="utf-8", errors="replace") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line was only half written when the app died.
+                    break
+                op = record.pop("op")
+                if op == "start":
+                    session["script"] = record["script"]
+                elif op == "inputs":
+                    session["inputs"] = record
+                else:
+                    apply_record(buffer, op, record)
+    except (KeyError, IndexError, TypeError, ValueError) as error:
+        # A record for a row that isn't there, carrying on would crash every launch.
+        buffer.clear()
+        path.unlink(missing_ok=True)
+        return {"script": None, "inputs": {}, "error": f"{type(error).__name__}: {error}"}
+    finally:
+        buffer.journal = journal
+    return session if session["script"] else None
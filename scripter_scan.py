@@ -0,0 +1,235 @@
+"""
+Reads the songs of an album from its folder of audio files, no GUI.
+Titles, track and disc numbers come from the tags if mutagen is installed,
+otherwise from the filenames, ie. "03 - Title.mp3", "1-03 Title.flac" or "B2 Title.mp3".
+Big folders are read in a process pool and the tracks come back in order
+as they are read, so the rows can be shown while the rest are still being read.
+oktl
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, NamedTuple
+
+import scripter_engine as se
+
+try:
+    import mutagen
+except ImportError:  # Optional, the filenames are used without it.
+    mutagen = None
+
+AUDIO_EXTENSIONS = {
+    ".aac", ".aif", ".aiff", ".ape", ".flac", ".m4a", ".mp3", ".mp4",
+    ".ogg", ".opus", ".wav", ".wma", ".wv",
+}
+
+# Optional disc number and dash, or LP side letter, then the track number and the title.
+FILENAME_PATTERN = re.compile(
+    r"^(?:(?P<disc>\d{1,2})-(?=\d)|(?P<side>[A-Za-z])(?=\d))?"
+    r"(?P<number>\d{1,3})(?!\d)[\s.)_-]*(?P<title>.*)$"
+)
+
+# Fewer files than this are read without starting the process pool.
+POOL_THRESHOLD = 32
+
+
+class Track(NamedTuple):
+    """One audio file of the album."""
+
+    path: str
+    side: str  # LP side letter from the filename, "" if there isn't one.
+    disc: int
+    disc_total: int  # 0 if it's not known.
+    number: int  # 0 if it's not known.
+    title: str
+
+
+def parse_position(value) -> tuple:
+    """Read a track or disc tag like "3" or "3/12" as (3, 12), missing parts are 0."""
+    number, _, total = str(value or "").partition("/")
+    number, total = number.strip(), total.strip()
+    return (
+        int(number) if number.isdigit() else 0,
+        int(total) if total.isdigit() else 0,
+    )
+
+
+def parse_track_name(text: str, path: str = "", disc: int = 1) -> Track | None:
+    """Read the side, disc, number and title from a name like "B2 Title" or "1-03 Title".
+
+    Args:
+        text (str): filename without the extension, or a tracklist line.
+        path (str, optional): where the track came from.
+        disc (int, optional): disc if the text doesn't have one. Defaults to 1.
+
+    Returns:
+        Track: None if the text doesn't start with a track number.
+    """
+    if not (match := FILENAME_PATTERN.match(text)):
+        return None
+    side = (match["side"] or "").upper()
+    if match["disc"]:
+        disc = int(match["disc"])
+    return Track(path, side, disc, 0, int(match["number"]), match["title"].strip() or text)
+
+
+def track_from_filename(path: str, disc: int = 1) -> Track:
+    """Make the track from the filename, for files without tags.
+
+    Args:
+        path (str): path of the audio file.
+        disc (int, optional): disc from the folder the file is in. Defaults to 1.
+
+    Returns:
+        Track: the number is 0 if the filename doesn't start with one.
+    """
+    stem = Path(path).stem.strip()
+    return parse_track_name(stem, path, disc) or Track(path, "", disc, 0, 0, stem)
+
+
+def read_track(item: tuple) -> Track:
+    """Read one file's tags, runs in the worker processes.
+
+    Args:
+        item (tuple): (path, disc from the folder).
+
+    Returns:
+        Track: from the tags, with whatever they're missing from the filename.
+    """
+    path, disc = item
+    from_name = track_from_filename(path, disc)
+    if mutagen is None:
+        return from_name
+    try:
+        audio = mutagen.File(path, easy=True)
+    except (mutagen.MutagenError, OSError):
+        return from_name
+    tags = getattr(audio, "tags", None) or {}
+
+    def tag(name):
+        values = tags.get(name) or [""]
+        return str(values[0]).strip()
+
+    number, _ = parse_position(tag("tracknumber"))
+    tag_disc, disc_total = parse_position(tag("discnumber"))
+    return Track(
+        path,
+        from_name.side,
+        tag_disc or from_name.disc,
+        disc_total,
+        number or from_name.number,
+        tag("title") or from_name.title,
+    )
+
+
+def natural_key(path: str) -> list:
+    """Sort key so "Track 2" comes before "Track 10"."""
+    return [int(part) if part.isdigit() else part.casefold() for part in re.split(r"(\d+)", path)]
+
+
+def iter_audio_files(folder: Path) -> list:
+    """Find the audio files of an album, with the disc each one is on.
+
+    Files in the folder itself are disc 1. If the songs are in subfolders,
+    like "CD1" and "CD2", each subfolder is the next disc, in name order.
+
+    Args:
+        folder (pathlib.Path): the album folder.
+
+    Returns:
+        list: (path, disc) for each file, in disc and filename order.
+    """
+    files, folders = [], []
+    with os.scandir(folder) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                folders.append(entry.path)
+            elif os.path.splitext(entry.name)[1].lower() in AUDIO_EXTENSIONS:
+                files.append(entry.path)
+    items = [(path, 1) for path in sorted(files, key=natural_key)]
+    disc = 1 if items else 0
+    for subfolder in sorted(folders, key=natural_key):
+        songs = [path for path, _ in iter_audio_files(subfolder)]
+        if songs:
+            disc += 1
+            items.extend((path, disc) for path in songs)
+    return items
+
+
+def scan_folder(folder: Path, workers: int = None, chunksize: int = 8) -> Iterator[Track]:
+    """Read the tracks of the album in folder, in order, as they are read.
+
+    Args:
+        folder (pathlib.Path): the album folder.
+        workers (int, optional): processes to read with. Defaults to the number of CPUs.
+        chunksize (int, optional): files sent to a process at a time. Defaults to 8.
+
+    Yields:
+        Track: one for each audio file.
+    """
+    items = iter_audio_files(folder)
+    if len(items) < POOL_THRESHOLD:
+        yield from map(read_track, items)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # map keeps the order, and hands each result over as soon as it, and the ones before, are done.
+        yield from pool.map(read_track, items, chunksize=chunksize)
+
+
+class RowBuilder:
+    """Makes catalog_song rows from the tracks as they're scanned.
+
+    The last row is held back until finish(), so it can be closed with the
+    semicolon. Once a track is found on a second disc or LP side, all the rows
+    get the side prefix, add() returns the earlier ones that need fixing.
+    """
+
+    def __init__(self, album_id) -> None:
+        """
+        Args:
+            album_id (str or int): album id for the rows.
+        """
+        self.album_id = album_id
+        self.sides = False
+        self.tracks = []
+        self.pending = None
+        self.stopped_at = None  # Title of the album the rest of the tracks were left out from.
+
+    def row(self, index: int) -> se.SongRow:
+        """Make the row for the track at index."""
+        track = self.tracks[index]
+        number = track.number or index + 1
+        if not self.sides:
+            return se.make_song_row(track.title, number, self.album_id)
+        return se.make_song_row(track.title, number, self.album_id, track.side or str(track.disc))
+
+    def add(self, track: Track) -> tuple:
+        """Add a scanned track.
+
+        Args:
+            track (Track): the next track.
+
+        Returns:
+            tuple: (list of rows ready to add to the script,
+                list of (index, row) for rows already added that changed).
+        """
+        fixes = []
+        if not self.sides and (track.side or track.disc > 1 or track.disc_total > 1):
+            self.sides = True
+            if track.side:
+                # Tracks read before the first side letter are on side A.
+                self.tracks = [
+                    earlier if earlier.side else earlier._replace(side="A")
+                    for earlier in self.tracks
+                ]
+            # The pending row isn't in the script yet, so it doesn't need fixing.
+            fixes = [(index, self.row(index)) for index in range(len(self.tracks) - 1)]
+        ready = [] if self.pending is None else [self.row(self.pending)]
+        self.tracks.append(track)
+        self.pending = len(self.tracks) - 1
+        return ready, fixes
+
+    def finish(self) -> se.SongRow | None:
+        """The held back last row, None if nothing was scanned."""
+        return None if self.pending is None else self.row(self.pending)
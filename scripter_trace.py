@@ -0,0 +1,188 @@
+"""
+Event loop tracer for sql_scripter, off unless it's turned on.
+For each event it records how long the handler took, how many widget
+update() calls it made and how long it spent in file and database I/O.
+The records go to a rotating JSONL log, one JSON object per line,
+and a p50/p95 summary per event can be shown while the app runs.
+
+Turn it on with the SQL_SCRIPTER_TRACE environment variable,
+set to the log file or to 1 for sql_scripter_trace.jsonl.
+oktl
+"""
+import functools
+import json
+import logging
+import os
+import statistics
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+TRACE_VARIABLE = "SQL_SCRIPTER_TRACE"
+DEFAULT_LOG = "sql_scripter_trace.jsonl"
+
+# How many handler times are kept per event for the summary.
+SAMPLES_PER_EVENT = 500
+
+
+class EventTracer:
+    """Times the handlers of the event loop.
+
+    Call begin() after window.read() returns and end() before the next read.
+    When it isn't enabled everything is a no-op, so it can stay in the loop.
+    """
+
+    def __init__(
+        self,
+        log_file: Path = None,
+        max_bytes: int = 1 << 20,
+        backup_count: int = 3,
+        enabled: bool = True,
+    ) -> None:
+        """
+        Args:
+            log_file (pathlib.Path, optional): JSONL file for the records,
+                None only keeps the summary.
+            max_bytes (int, optional): size the log rolls over at. Defaults to 1 MB.
+            backup_count (int, optional): old logs kept. Defaults to 3.
+            enabled (bool, optional): False makes the tracer do nothing.
+        """
+        self.enabled = enabled
+        self.event = None
+        self.started = None
+        self.updates = 0
+        self.io_seconds = 0.0
+        self._io_depth = 0
+        self.samples = defaultdict(lambda: deque(maxlen=SAMPLES_PER_EVENT))
+        self.logger = None
+        if enabled and log_file is not None:
+            self.logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self.logger.propagate = False
+            self.logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(
+                log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+            )
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self.logger.addHandler(handler)
+
+    @classmethod
+    def from_environment(cls, folder: Path = Path(".")) -> "EventTracer":
+        """Make the tracer from SQL_SCRIPTER_TRACE, a disabled one if it isn't set.
+
+        Args:
+            folder (pathlib.Path, optional): where the log goes if the variable is just 1.
+        """
+        setting = os.environ.get(TRACE_VARIABLE, "")
+        if setting.lower() in ("", "0", "false", "no"):
+            return cls(enabled=False)
+        log_file = Path(folder) / DEFAULT_LOG if setting.lower() in ("1", "true", "yes") else setting
+        return cls(Path(log_file).resolve())
+
+    def begin(self, event) -> None:
+        """Start timing the handler for event."""
+        if not self.enabled:
+            return
+        self.event = str(event)
+        self.updates = 0
+        self.io_seconds = 0.0
+        self.started = time.perf_counter()
+
+    def end(self) -> dict | None:
+        """Stop timing the handler, log it and add it to the summary.
+
+        Returns:
+            dict: the record for the event, None if nothing was being timed.
+        """
+        if not self.enabled or self.started is None:
+            return None
+        milliseconds = (time.perf_counter() - self.started) * 1000
+        self.started = None
+        record = {
+            "time": time.time(),
+            "event": self.event,
+            "ms": round(milliseconds, 3),
+            "updates": self.updates,
+            "io_ms": round(self.io_seconds * 1000, 3),
+        }
+        self.samples[self.event].append(milliseconds)
+        if self.logger is not None:
+            self.logger.info(json.dumps(record))
+        return record
+
+    @contextmanager
+    def io(self):
+        """Count the time in the with block as I/O, nested blocks are only counted once."""
+        if not self.enabled:
+            yield
+            return
+        self._io_depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._io_depth -= 1
+            if self._io_depth == 0:
+                self.io_seconds += time.perf_counter() - start
+
+    def watch_io(self, owner, *names: str) -> None:
+        """Time calls to owner's functions as I/O, by wrapping them on owner.
+
+        Args:
+            owner: module or object with the functions, ie. sf or script_buffer.
+            names (str): names of the functions.
+        """
+        if not self.enabled:
+            return
+        for name in names:
+            function = getattr(owner, name)
+
+            @functools.wraps(function)
+            def timed(*args, _function=function, **kwargs):
+                with self.io():
+                    return _function(*args, **kwargs)
+
+            setattr(owner, name, timed)
+
+    def watch_updates(self, window) -> None:
+        """Count the update() calls of every element in the window.
+
+        Args:
+            window (sg.Window): finalized window.
+        """
+        if not self.enabled:
+            return
+        for element in window.element_list():
+            update = element.update
+
+            def counted(*args, _update=update, **kwargs):
+                self.updates += 1
+                return _update(*args, **kwargs)
+
+            element.update = counted
+
+    def summary(self) -> list:
+        """Returns (event, count, p50 ms, p95 ms, max ms) for each event, slowest p95 first."""
+        rows = []
+        for event, samples in self.samples.items():
+            if len(samples) > 1:
+                cuts = statistics.quantiles(samples, n=20, method="inclusive")
+                p50, p95 = cuts[9], cuts[18]
+            else:
+                p50 = p95 = samples[0]
+            rows.append((event, len(samples), p50, p95, max(samples)))
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def summary_text(self, limit: int = 15) -> str:
+        """The summary as a text table, for the debug panel."""
+        lines = [f"{'event':24} {'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}"]
+        for event, count, p50, p95, longest in self.summary()[:limit]:
+            lines.append(f"{event[:24]:24} {count:5} {p50:8.1f} {p95:8.1f} {longest:8.1f}")
+        return "\n".join(lines)
+
+    def close(self) -> None:
+        if self.logger is not None:
+            for handler in self.logger.handlers[:]:
+                handler.close()
+                self.logger.removeHandler(handler)
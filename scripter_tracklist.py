@@ -0,0 +1,247 @@
+"""
+Reads the songs of albums from .cue sheets and plain text tracklists, no GUI.
+The files are read a line at a time, a file can have any number of albums
+one after another, so big concatenated tracklists never need to fit in memory.
+
+Each album starts with an AlbumStart, then its sscan.Tracks. The album id
+can be given in a cue sheet with "REM ALBUM_ID 123", or in a tracklist
+with an "album 123" or "album_id: 123" line.
+
+A text tracklist has a line per song, like "1. Title", "01 - Title",
+"A1 Title" or "B2. Title (3:45)". Lines like "CD 2" or "Disc 2" start the
+next disc, "Side A" or "Side B" the next LP side, other lines between
+songs start the next album.
+oktl
+"""
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+
+import scripter_scan as sscan
+
+# How much of the file is looked at to tell UTF-8 from Windows text.
+SNIFF_BYTES = 1 << 16
+
+ALBUM_ID_PATTERN = re.compile(r"^#?\s*album(?:[ _]?id)?\s*[:=]?\s*(\d+)\s*$", re.IGNORECASE)
+DISC_PATTERN = re.compile(r"^(?:cd|disc|disk)\s*(\d+)\b", re.IGNORECASE)
+# "Side A" or "Side 2" heading of an LP side.
+SIDE_PATTERN = re.compile(r"^side\s*([a-z]|\d{1,2})\s*:?\s*$", re.IGNORECASE)
+# Song length at the end of a tracklist line, ie. "3:45" or "(1:02:03)".
+LENGTH_PATTERN = re.compile(r"\s*[(\[]?\d{1,2}:\d{2}(?::\d{2})?[)\]]?\s*$")
+CUE_LINE_PATTERN = re.compile(r'^\s*(\w+)\s*(.*?)\s*$')
+
+
+class AlbumStart(NamedTuple):
+    """Start of the next album, before its tracks."""
+
+    album_id: int | None  # None if the file doesn't say.
+    title: str
+
+
+def unquote(value: str) -> str:
+    """Remove the quotes around a cue sheet value."""
+    if len(value) > 1 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+
+class CueSheetParser:
+    """Turns cue sheet lines into AlbumStarts and tracks, a line at a time.
+
+    A new album starts at "REM ALBUM_ID", at a second TITLE after a track
+    already has one (the title of the next sheet), or when the track
+    numbers start over without a new disc.
+    """
+
+    def __init__(self) -> None:
+        self.album_id = None
+        self.album_title = ""
+        self.album_started = False
+        self.disc = 1
+        self.disc_total = 0
+        self.last_number = 0
+        self.track = None  # [number, title] of the track being read.
+
+    def next_album(self) -> Iterator:
+        """Finish the album being read, the header lines for the next one follow."""
+        yield from self.finish_track()
+        self.album_id = None
+        self.album_title = ""
+        self.album_started = False
+        self.disc = 1
+        self.disc_total = 0
+        self.last_number = 0
+
+    def finish_track(self) -> Iterator[sscan.Track]:
+        if self.track is not None:
+            number, title = self.track
+            self.track = None
+            yield sscan.Track("", "", self.disc, self.disc_total, number, title)
+
+    def feed(self, line: str) -> Iterator:
+        """Read one line of the cue sheet.
+
+        Yields:
+            AlbumStart or sscan.Track: whatever the line finished.
+        """
+        if not (match := CUE_LINE_PATTERN.match(line)):
+            return
+        command, value = match[1].upper(), match[2]
+        if command == "REM":
+            name, _, rem_value = value.partition(" ")
+            name, rem_value = name.upper(), unquote(rem_value.strip())
+            if name == "ALBUM_ID" and rem_value.isdigit():
+                if self.album_started:
+                    yield from self.next_album()
+                self.album_id = int(rem_value)
+            elif name == "DISCNUMBER":
+                disc, total = sscan.parse_position(rem_value)
+                if self.album_started and disc > self.disc:
+                    yield from self.finish_track()
+                    self.last_number = 0
+                self.disc, self.disc_total = disc or self.disc, total or self.disc_total
+            elif name == "TOTALDISCS":
+                self.disc_total = sscan.parse_position(rem_value)[0]
+        elif command == "TITLE":
+            if self.track is None and not self.album_started:
+                self.album_title = unquote(value)
+            elif self.track is not None and not self.track[1]:
+                self.track[1] = unquote(value)
+            else:
+                # The track already has its title, this is the next sheet's.
+                yield from self.next_album()
+                self.album_title = unquote(value)
+        elif command == "TRACK":
+            number = sscan.parse_position(value.split()[0] if value else "")[0]
+            yield from self.finish_track()
+            if self.album_started and number <= self.last_number:
+                yield from self.next_album()
+            if not self.album_started:
+                self.album_started = True
+                yield AlbumStart(self.album_id, self.album_title)
+            self.last_number = number
+            self.track = [number, ""]
+
+    def close(self) -> Iterator[sscan.Track]:
+        """The end of the file, finishes the last track."""
+        yield from self.finish_track()
+
+
+class TracklistParser:
+    """Turns plain text tracklist lines into AlbumStarts and tracks, a line at a time."""
+
+    def __init__(self) -> None:
+        self.album_id = None
+        self.album_title = ""
+        self.album_started = False
+        self.disc = 1
+        self.side = ""  # From a "Side B" heading, for songs numbered without the letter.
+        self.last_track = None
+
+    def next_album(self) -> None:
+        self.album_id = None
+        self.album_title = ""
+        self.album_started = False
+        self.disc = 1
+        self.side = ""
+        self.last_track = None
+
+    def starts_over(self, track: sscan.Track) -> bool:
+        """True if the numbers went back to the start, ie. the next album without a heading."""
+        last = self.last_track
+        if last is None or track.disc != last.disc:
+            return False
+        if track.side != last.side:
+            # A1..A5 then B1 is the next side, going back to A is the next album.
+            return bool(track.side) and bool(last.side) and track.side < last.side
+        return track.number <= last.number
+
+    def feed(self, line: str) -> Iterator:
+        """Read one line of the tracklist.
+
+        Yields:
+            AlbumStart or sscan.Track: the track on the line, after an AlbumStart
+                if it's the album's first.
+        """
+        text = line.strip()
+        if not text:
+            return
+        if match := ALBUM_ID_PATTERN.match(text):
+            if self.album_started:
+                self.next_album()
+            self.album_id = int(match[1])
+            return
+        if match := DISC_PATTERN.match(text):
+            self.disc = int(match[1])
+            return
+        if match := SIDE_PATTERN.match(text):
+            side = match[1].upper()
+            # Side 1, 2 are sides A, B.
+            self.side = chr(ord("A") + int(side) - 1) if side.isdigit() else side
+            return
+        text = LENGTH_PATTERN.sub("", text)
+        track = sscan.parse_track_name(text, disc=self.disc)
+        if track is not None and not track.side and self.side:
+            track = track._replace(side=self.side)
+        if track is None:
+            # A heading between the songs is the next album's title.
+            if self.album_started:
+                self.next_album()
+            self.album_title = text
+            return
+        if self.album_started and self.starts_over(track):
+            self.next_album()
+            # Read it again, the disc and side from the album before don't carry over.
+            track = sscan.parse_track_name(text, disc=self.disc)
+        if not self.album_started:
+            self.album_started = True
+            yield AlbumStart(self.album_id, self.album_title)
+        self.disc = track.disc
+        self.last_track = track
+        yield track
+
+    def close(self) -> Iterator:
+        return iter(())
+
+
+def file_encoding(filename: Path) -> str:
+    """UTF-8 if the start of the file reads as UTF-8, otherwise Windows text, as older rips use."""
+    with open(filename, "rb") as file:
+        start = file.read(SNIFF_BYTES)
+    try:
+        # A multi byte character can be cut off at the end of what was read.
+        start.decode("utf-8-sig")
+    except UnicodeDecodeError as error:
+        if error.start < len(start) - 3:
+            return "cp1252"
+    return "utf-8-sig"
+
+
+def parse_lines(lines: Iterable, cue_sheet: bool) -> Iterator:
+    """Read albums and tracks from lines of a cue sheet or tracklist.
+
+    Args:
+        lines (iterable): the lines, ie. an open file.
+        cue_sheet (bool): True for a cue sheet, False for a text tracklist.
+
+    Yields:
+        AlbumStart or sscan.Track: an AlbumStart before the tracks of each album.
+    """
+    parser = CueSheetParser() if cue_sheet else TracklistParser()
+    for line in lines:
+        yield from parser.feed(line)
+    yield from parser.close()
+
+
+def iter_tracklist(filename: Path) -> Iterator:
+    """Read albums and tracks from a .cue sheet or a text tracklist, a line at a time.
+
+    Args:
+        filename (pathlib.Path): .cue file, or a text file with a song per line.
+
+    Yields:
+        AlbumStart or sscan.Track: an AlbumStart before the tracks of each album.
+    """
+    cue_sheet = Path(filename).suffix.lower() == ".cue"
+    with open(filename, encoding=file_encoding(filename), errors="replace") as file:
+        yield from parse_lines(file, cue_sheet)
@@ -7,14 +7,26 @@ tables in the database.
 
 VERSION: 1.00
 """
+import multiprocessing
 import sqlite3
-from contextlib import chdir, closing, suppress
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import chdir, suppress
 from os import chdir as cd
 from pathlib import Path
 
-import PySimpleGUI as sg
-
+import scripter_db as sdb
+import scripter_engine as se
+import scripter_events as sev
 import scripter_functions as sf
+import scripter_journal as sj
+import scripter_scan as sscan
+import scripter_trace as st
+import scripter_tracklist as stl
+
+# PySimpleGUI (and Tk) only load when the window is built in main().
+sg = sf.lazy_import("PySimpleGUI")
 
 # These lines are needed for the Help and About files,
 # to change to the path with the Resources folder they are in.
@@ -23,6 +35,27 @@ import scripter_functions as sf
 #? - add choose file buttons for path_to_app and path_to_db?
 path_to_app = Path("A:/working_apps/scripter")
 path_to_db = Path("A:/muse-test-many/musica")
+# Albums committed in each transaction, 0 commits the whole session queue in one.
+albums_per_commit = 0
+# Other copies of the database, ie. production, committed to at the same time
+# as the one in path_to_db, and checked against it afterwards.
+replica_db_paths = [
+    # Path("A:/muse/musica/db.sqlite3"),
+]
+
+# One connection for the app, opened at startup and closed on Exit.
+# The index of songs already in the database loads when it connects.
+db = sdb.ConnectionManager(path_to_db / "db.sqlite3")
+catalog_index = sdb.CatalogIndex()
+db.on_connect.append(catalog_index.load)
+# Album titles and artists for the album picker, in memory too.
+album_index = sdb.AlbumIndex()
+db.on_connect.append(album_index.load)
+# Empty copy of the tables in memory, scripts are dry run on it before a commit.
+schema_clone = sdb.SchemaClone()
+db.on_connect.append(schema_clone.load)
+# Reads catalog_song a page at a time for the browser, on its own connection.
+catalog_pager = sdb.CatalogPager(db.db_path)
 
 keys_to_clear = [
     "-FOLDER-",
@@ -31,24 +64,60 @@ keys_to_clear = [
     "-TITLE-",
     "-SONG-NUMBER-",
     "-SIDE-",
-    "-STATUS-"
+    "-STATUS-",
+    "-ALBUM-SEARCH-",
 ]  # '-RESULT
 custom_icon = sf.get_custom_icon()  # Titlebar icon.
 title_icon = "add32.png"
 
-# For counting rows as they're added to script,
-# to know when to disable Next Song button..
-row_counter = 0
+# The script in memory, its rows are typed tuples and are what get committed.
+script_buffer = se.ScriptBuffer()
+# Every change to the rows is journaled, so the session can be carried on after a crash.
+journal_folder = path_to_app if path_to_app.exists() else Path(__file__).parent
+journal = sj.SessionJournal(journal_folder / "session.journal")
+script_buffer.journal = journal
+# Checks the rows of the script as it's edited by hand, only the lines that change.
+script_validator = se.ScriptValidator()
+# Titles already in the database, suggested as a title is typed.
+title_index = sdb.TitleIndex(journal_folder / "titles.sqlite3", db.db_path)
+# The albums found by the album picker, by how they're shown in its list.
+album_choices = {}
+
+# Set to cancel the commit running in the background, it gets rolled back.
+commit_cancel = threading.Event()
+
+# Scanned tracks are sent to the window in batches, at most this often.
+SCAN_POST_SECONDS = 0.1
 
 # Enter key clicks the button that has focus.
 QT_ENTER_KEY1 = "special 16777220"
 QT_ENTER_KEY2 = "special 16777221"
 
+# Typing in these inputs is handled once the input has been quiet this long, in seconds.
+INPUT_DELAYS = {
+    "-TITLE-": 0.15,
+    "-ALBUM-ID-": 0.15,
+    "-NUMBER-": 0.15,
+    "-ALBUM-SEARCH-": 0.15,
+    "-FOLDER-": 0,
+}
+# Inputs that can be left empty, they're not checked before a song is added.
+OPTIONAL_INPUTS = ("-ALBUM-SEARCH-",)
+
+# The key presses the event loop does something with, the others are dropped.
+KEYS_HANDLED = {"\r", "F1:112", "F2:113", "F4:115"}  # Enter, Help, About and Exit.
 
-def show_message(key: str, message: str, color: str="white") -> None:
+
+def required_inputs(values: dict) -> dict:
+    """The values that have to be filled in, for sf.check_inputs()."""
+    return {key: value for key, value in values.items() if key not in OPTIONAL_INPUTS}
+
+
+def show_message(window, key: str, message: str, color: str="white") -> None:
     """Updates the specified window element with the given message and color.
 
     Args:
+        window (sg.Window): the main window.
         key (str): The key of the window element to update.
         message (str): The message to display.
         color (str, optional): The color of the text. Defaults to "white".
@@ -56,7 +125,7 @@ def show_message(key: str, message: str, color: str="white") -> None:
     window[key].update(message, text_color=color)
 
 
-def get_song_inputs() -> list:
+def get_song_inputs(values: dict) -> list:
     """Returns data from the song inputs"""
     album_id = values["-ALBUM-ID-"]
     song_title = values["-TITLE-"]
@@ -65,725 +134,1898 @@ def get_song_inputs() -> list:
     return [album_id, song_title, song_number, album_side]
 
 
-def create_song_row() -> list:
-    """Creates a list with values from database fields based on the song inputs.
+def journal_inputs(window, values: dict) -> None:
+    """Journal the inputs that aren't in the rows, so a resume can put them back."""
+    journal.note_inputs(
+        album_id=values["-ALBUM-ID-"], songs=values["-NUMBER-"], lp=window["-RB-LP-"].get()
+    )
+
+
+def create_song_row(window, values: dict) -> se.SongRow:
+    """Creates a row with values for database fields based on the song inputs.
+
+    Args:
+        window (sg.Window): the main window.
+        values (dict): values of the window inputs.
 
     Returns:
-        list: list with values for database fields.
+        se.SongRow: typed row for the catalog_song table.
     """
-    album_id, song_title, song_number, album_side = get_song_inputs()
+    album_id, song_title, song_number, album_side = get_song_inputs(values)
     if not window["-RB-LP-"].get():
-        return get_song_row(song_title, song_number, album_id)
+        return get_song_row(window, song_title, song_number, album_id)
 
     # Change song number to album side or cd# and orignal song number ie. "A-1", "A-2","A-3",
-    return get_song_row(song_title, f'{album_side}-{song_number},', album_id)
+    return get_song_row(window, song_title, song_number, album_id, album_side)
 
 
-def get_song_row(song_title, song_number, album_id) -> list:
-    """Creates a list with values for database fields based on the song information.
+def get_song_row(window, song_title, song_number, album_id, album_side="") -> se.SongRow:
+    """Creates a row with values for database fields based on the song information.
 
     Args:
+        window (sg.Window): the main window.
         song_title (str): The title of the song, from -SONG-TITLE- input
-        song_number (int or str): the number of the song, from -SONG-NUMBER- input
+        song_number (int): the number of the song, from -SONG-NUMBER- input
         album_id (str): the album id for the song, from -ALBUM-ID- input
+        album_side (str, optional): LP side or CD number, from -SIDE- input
 
     Returns:
-        list: list of fields to make a row for sql script.
+        se.SongRow: (song_title, song_number, album_id) row for the script.
     """
-    song_row = [song_title, song_number, album_id]
-    show_message("-INFO-", f"\nSong added to script: \n    {song_row}")
+    song_row = se.make_song_row(song_title, song_number, album_id, album_side)
+    show_message(window, "-INFO-", f"\nSong added to script: \n    {tuple(song_row)}")
     return song_row
 
 
-def show_script(script_name):
-    """Show the script as rows are appended to it in the -SCRIPT- element"""
+def show_script(window, script_name):
+    """Show a script file in the -SCRIPT- element"""
     sql_file = sf.open_text_file(script_name)
     window["-SCRIPT-"].update(sql_file)
 
 
-# This is not doing what I hoped it would, only checks for closing semi-colon.
-# Only a problem when editing a script.
-def check_sql_script(script: str) -> bool:
-    """Uses sqlite3 function to check script for unclosed string literals and closing semicolon.
+def show_script_row(window, line: str) -> None:
+    """Append one row of the script to the -SCRIPT- element, without redrawing the rest.
 
     Args:
-        script (str): sql script to check.
+        window (sg.Window): the main window.
+        line (str): formatted row from se.ScriptBuffer.add_row.
+    """
+    window["-SCRIPT-"].update(line, append=True)
+
+
+def save_script(script_name, text: str, script_edited: bool) -> None:
+    """Write the script to its file, from the rows unless it was edited by hand.
+
+    Args:
+        script_name (str): filename to save the script as.
+        text (str): text of the -SCRIPT- element, saved if the script was edited.
+        script_edited (bool): True if the script text no longer matches the rows.
+    """
+    if script_edited:
+        # The open file has the rows, not the edited text.
+        script_buffer.close_file()
+        with open(script_name, "w") as file:
+            file.write(text)
+    else:
+        script_buffer.save(script_name)
+
+
+def connect_worker(window) -> None:
+    """Connect to the database and load the catalog index. Runs in a worker thread.
+
+    Posts -DB-CONNECTED- with the number of songs indexed, or -DB-ERROR-.
+
+    Args:
+        window (sg.Window): the main window, the events are posted to it.
+    """
+    try:
+        db.connect()
+    except sqlite3.Error as error:
+        window.write_event_value("-DB-ERROR-", str(error))
+    else:
+        window.write_event_value("-DB-CONNECTED-", len(catalog_index.song_numbers))
+
+
+def refresh_index_worker() -> None:
+    """Add songs and albums that other apps committed to the indexes. Runs in a worker thread."""
+    with suppress(sqlite3.Error), db.lock:
+        catalog_index.refresh(db.connect())
+        album_index.refresh(db.connect())
+
+
+def show_album(window, album_id: str) -> None:
+    """Show which album the Album ID is, so a wrong one is seen before songs are added."""
+    if not album_index.is_loaded or not album_id.strip().isdigit():
+        return
+    if album := album_index.get(album_id):
+        show_message(window, "-STATUS-", f"Album {album.album_id}: {album.label()}")
+    else:
+        show_message(window, "-STATUS-", f"Album {album_id} is not in the database.", "orange")
+
+
+def pick_album(window, values: dict, album: sdb.Album) -> None:
+    """Use the album chosen in the album picker.
+
+    Fills in the Album ID, and the # of songs if the albums table has it.
+    The list stays open so the arrow keys can go on to the next album.
+
+    Args:
+        window (sg.Window): the main window.
+        values (dict): values from window.read().
+        album (sdb.Album): the album chosen.
+    """
+    window["-ALBUM-ID-"].update(album.album_id)
+    if album.tracks:
+        window["-NUMBER-"].update(album.tracks)
+    show_album(window, str(album.album_id))
+    # Updating the Album ID doesn't make an event, so the browser is told here.
+    if values["-BROWSE-ALBUM-"] and db.is_open:
+        read_page(window, catalog_pager.start(album.album_id))
+
+
+def close_album_picker(window) -> None:
+    """Hide the albums found and empty the search."""
+    window["-ALBUM-LIST-"].update(values=[], visible=False)
+    window["-ALBUM-SEARCH-"].update("")
+
+
+def title_typed(window, values: dict) -> None:
+    """Look up titles like the one typed."""
+    if db.is_open:
+        suggest_titles(window, values["-TITLE-"])
+
+
+def album_id_typed(window, values: dict) -> None:
+    """Show which album it is, and its songs if the browser shows only this album."""
+    show_album(window, values["-ALBUM-ID-"])
+    album_id = browse_album(values)
+    if db.is_open and album_id != catalog_pager.album_id:
+        read_page(window, catalog_pager.start(album_id))
+
+
+def song_count_typed(window, values: dict) -> None:
+    songs = values["-NUMBER-"].strip()
+    if songs and not songs.isdigit():
+        show_message(window, "-INFO-", "\n# of songs has to be a number.", "yellow")
+
+
+def album_search_typed(window, values: dict) -> None:
+    """Search the albums, in memory so it's quick."""
+    albums = album_index.search(values["-ALBUM-SEARCH-"])
+    album_choices.clear()
+    album_choices.update((album.label(), album) for album in albums)
+    window["-ALBUM-LIST-"].update(values=list(album_choices), visible=bool(albums))
+
+
+def folder_chosen(window, values: dict) -> None:
+    show_message(window, "-INFO-", "\nCreate the script")
+
+
+def browse_worker(window, query: sdb.BrowseQuery) -> None:
+    """Read a page for the catalog browser. Runs in a worker thread.
+
+    Posts -BROWSE-PAGE- with (query, rows), or -BROWSE-ERROR-.
+
+    Args:
+        window (sg.Window): the main window, the events are posted to it.
+        query (sdb.BrowseQuery): the page to read.
+    """
+    try:
+        rows = catalog_pager.fetch(query)
+    except sqlite3.Error as error:
+        window.write_event_value("-BROWSE-ERROR-", str(error))
+    else:
+        window.write_event_value("-BROWSE-PAGE-", (query, rows))
+
+
+def read_page(window, query: sdb.BrowseQuery | None) -> None:
+    """Read the page in the background, if there's one to read."""
+    if query is not None:
+        window.perform_long_operation(lambda: browse_worker(window, query), "-BROWSE-THREAD-")
+
+
+def browse_album(values: dict) -> int | None:
+    """The album to show in the browser, None for the whole catalog."""
+    album_id = values["-ALBUM-ID-"].strip()
+    if values["-BROWSE-ALBUM-"] and album_id.isdigit():
+        return int(album_id)
+    return None
+
+
+def show_page(window, query: sdb.BrowseQuery, rows: list) -> None:
+    """Add a page to the browser, keeping it scrolled to the same songs."""
+    table = window["-BROWSER-"]
+    top = table.Widget.yview()[0] * len(catalog_pager.rows)
+    shift = catalog_pager.add_page(query, rows)
+    if shift is None:
+        # The album was changed while it was being read.
+        return
+    shown = catalog_pager.rows
+    table.update(values=shown)
+    if not shown:
+        window["-BROWSE-STATUS-"].update("No songs")
+        return
+    if query.replace:
+        table.Widget.yview_moveto(1.0 if query.from_end else 0.0)
+    else:
+        table.Widget.yview_moveto(max(0, round(top) + shift) / len(shown))
+    window["-BROWSE-STATUS-"].update(f"Song IDs {shown[0][0]} to {shown[-1][0]}")
+
+
+def watch_browser_scroll(window) -> None:
+    """Post -BROWSE-SCROLL- when the browser is scrolled near the top or the bottom of
+    the rows it has, so the next page is read before it's needed.
+
+    Args:
+        window (sg.Window): the finalized main window.
+    """
+    table = window["-BROWSER-"]
+    scrollbar = getattr(table, "vsb", None)
+
+    def scrolled(first, last):
+        if scrollbar is not None:
+            scrollbar.set(first, last)
+        first, last = float(first), float(last)
+        if catalog_pager.pending is None and (
+            (first < 0.1 and not catalog_pager.at_start)
+            or (last > 0.9 and not catalog_pager.at_end)
+        ):
+            window.write_event_value("-BROWSE-SCROLL-", (first, last))
+
+    table.Widget.configure(yscrollcommand=scrolled)
+
+
+def title_index_worker(window) -> None:
+    """Index the titles added since the app last ran. Runs in a worker thread.
+
+    Posts -TITLES-INDEXED- with the number of titles indexed, nothing if
+    there's no FTS5 to index them with.
+
+    Args:
+        window (sg.Window): the main window, the events are posted to it.
+    """
+    with suppress(sqlite3.Error):
+        window.write_event_value("-TITLES-INDEXED-", title_index.refresh())
+
+
+def suggest_worker(window, generation: int, text: str) -> None:
+    """Look up titles like the one being typed. Runs in a worker thread.
+
+    Posts -SUGGESTIONS- with (generation, titles), nothing if a newer lookup
+    cancelled it.
+
+    Args:
+        window (sg.Window): the main window, the events are posted to it.
+        generation (int): from title_index.start_lookup().
+        text (str): the title typed so far.
+    """
+    with suppress(sqlite3.Error):
+        titles = title_index.lookup(generation, text)
+        if titles is not None:
+            window.write_event_value("-SUGGESTIONS-", (generation, titles))
+
+
+def suggest_titles(window, text: str) -> None:
+    """Start looking up titles for the text typed, hiding the old suggestions if it's too short."""
+    generation = title_index.start_lookup(text)
+    if generation is None:
+        window["-SUGGEST-"].update(values=[], visible=False)
+    else:
+        window.perform_long_operation(
+            lambda: suggest_worker(window, generation, text), "-SUGGEST-THREAD-")
+
+
+def hide_suggestions(window) -> None:
+    """The title has been used, any lookup still running is cancelled."""
+    title_index.cancel()
+    window["-SUGGEST-"].update(values=[], visible=False)
+
+
+def scan_worker(window, tracks_to_read) -> None:
+    """Read the songs from an album folder or a tracklist. Runs in a worker thread.
+
+    Posts -SCAN-TRACKS- with lists of sscan.Tracks as they're read, then
+    -SCAN-DONE- with (tracks read, seconds) or -SCAN-ERROR-.
+    Tracklists can have more than one album, each starts with a stl.AlbumStart.
+
+    Args:
+        window (sg.Window): the main window, the events are posted to it.
+        tracks_to_read (iterator): from sscan.scan_folder or stl.iter_tracklist.
+    """
+    start = time.perf_counter()
+    tracks = []
+    count = 0
+    posted = 0.0
+    try:
+        for track in tracks_to_read:
+            tracks.append(track)
+            count += isinstance(track, sscan.Track)
+            # The first track goes right away, then in batches so the window keeps up.
+            if time.perf_counter() - posted > SCAN_POST_SECONDS:
+                window.write_event_value("-SCAN-TRACKS-", tracks)
+                tracks = []
+                posted = time.perf_counter()
+    except OSError as error:
+        window.write_event_value("-SCAN-ERROR-", (tracks, str(error)))
+        return
+    if tracks:
+        window.write_event_value("-SCAN-TRACKS-", tracks)
+    window.write_event_value("-SCAN-DONE-", (count, time.perf_counter() - start))
+
+
+def add_scanned_tracks(window, builder: sscan.RowBuilder, tracks: list, slots: list) -> sscan.RowBuilder:
+    """Add the rows for the scanned tracks to the script as they come in.
+
+    Args:
+        window (sg.Window): the main window.
+        builder (sscan.RowBuilder): makes the rows for the album being read.
+        tracks (list): sscan.Tracks just read, and stl.AlbumStarts from a tracklist.
+        slots (list): the script_buffer slot of each row added for this album.
+
+    Returns:
+        sscan.RowBuilder: the builder for the album being read, a new one
+            if the tracks started another album. Its stopped_at is set if an
+            album had no id and none was given, the tracks after it are left out.
+    """
+    redraw = False
+    for track in tracks:
+        if builder.stopped_at is not None:
+            break
+        if isinstance(track, stl.AlbumStart):
+            if builder.tracks:
+                album_id = track.album_id
+                if album_id is None:
+                    # The file doesn't say, only the user knows the next album's id.
+                    album_id = sg.popup_get_text(
+                        f'Album ID for "{track.title or "the next album"}",'
+                        "\nor Cancel to stop before it:",
+                        no_titlebar=True, keep_on_top=True)
+                    if not (album_id and album_id.strip().isdigit()):
+                        builder.stopped_at = track.title or "the next album"
+                        break
+                # Close the album and carry on with the next one in the same script.
+                script_buffer.add_row(builder.finish(), last=True)
+                script_buffer.next_album()
+                builder = sscan.RowBuilder(int(album_id))
+                slots.clear()
+                redraw = True
+            elif track.album_id is not None:
+                builder.album_id = track.album_id
+            window["-ALBUM-ID-"].update(builder.album_id)
+            continue
+        rows, fixes = builder.add(track)
+        # A second disc or side was found, the rows before it get the side too.
+        if fixes:
+            script_buffer.fix_rows([(slots[index], row) for index, row in fixes])
+            redraw = True
+        for row in rows:
+            line = script_buffer.add_row(row)
+            slots.append(script_buffer.rows.last_slot())
+            if not redraw:
+                show_script_row(window, line)
+    if redraw:
+        window["-SCRIPT-"].update(script_buffer.text())
+    show_message(window, "-STATUS-", 
+        f"Reading... {len(script_buffer.queue)} albums queued, {len(builder.tracks)} songs read.")
+    return builder
+
+
+def finish_scan(window, builder: sscan.RowBuilder, last: bool = True) -> None:
+    """Add the held back last row of the scan and set the inputs up after it.
+
+    Args:
+        window (sg.Window): the main window.
+        builder (sscan.RowBuilder): makes the rows for this scan.
+        last (bool, optional): False if the scan stopped early, the album isn't finished.
+    """
+    if (row := builder.finish()) is not None:
+        show_script_row(window, script_buffer.add_row(row, last))
+        script_buffer.checkpoint()
+    album_side, song_number = se.split_song_number(row.song_number) if row else ("", 0)
+    window["-NUMBER-"].update(len(script_buffer.rows))
+    window["-SONG-NUMBER-"].update(song_number + 1)
+    if album_side:
+        window["-SIDE-"].update(album_side)
+    window["Next Song"].update(disabled=last)
+    window["Last Song"].update(disabled=last)
+    window["Next Album"].update(disabled=not last)
+    window["Copy script"].update(disabled=not last)
+
+
+def check_song_row(window, song_row: se.SongRow) -> None:
+    """Flag the row in -INFO- if it's already in the database or the album isn't.
+
+    Args:
+        window (sg.Window): the main window.
+        song_row (se.SongRow): row that was just added to the script.
+    """
+    if conflicts := catalog_index.check_row(song_row):
+        show_message(window, "-INFO-", 
+            "Song added to script, but check it:\n" + "\n".join(conflicts), "orange")
+    if db.is_open and catalog_index.is_stale():
+        window.perform_long_operation(refresh_index_worker, "-INDEX-REFRESHED-")
+
+
+def commit_worker(window, albums: list, script: str, upsert: bool = False) -> None:
+    """Commit the albums, or the script text if there are none. Runs in a worker thread.
+
+    Posts -COMMIT-PROGRESS- with (rows written, seconds) as it goes,
+    then -COMMIT-DONE-, -COMMIT-CANCELLED- or -COMMIT-ERROR- when it's finished.
+    -COMMIT-DONE- has (rows written, seconds, statement report, upsert counts),
+    the report is empty when the rows were committed and the counts are None
+    unless the rows were upserted. -COMMIT-CANCELLED- has
+    (seconds, rows already committed by earlier batches).
+    The replica databases are committed to at the same time, then
+    -COPIES-DONE- says how they went and if they match.
+
+    Args:
+        window (sg.Window): the main window, the events are posted to it.
+        albums (list): a list of SongRows for each album, empty to execute the script.
+        script (str): script text to execute if there are no albums.
+        upsert (bool, optional): update songs already in catalog_song instead of
+            adding them again, needs the song index. Defaults to False.
+    """
+    start = time.perf_counter()
+    album_ids = committed_album_ids(albums, script)
+    copies = []
+
+    def progress(rows_written: int) -> None:
+        window.write_event_value(
+            "-COMMIT-PROGRESS-", (rows_written, time.perf_counter() - start))
+
+    try:
+        with db.lock:
+            report = []
+            counts = None
+            if upsert and not se.has_song_index(db.connect()):
+                window.write_event_value("-COMMIT-ERROR-",
+                    "Updating existing songs needs the unique index on album_id and "
+                    "song_number.\nUse Actions > Create song index first.")
+                return
+            copies = start_copies(albums, script, upsert, album_ids)
+            if albums and upsert:
+                counts = se.commit_albums(
+                    db.connect(), albums, albums_per_commit,
+                    progress=progress, cancel=commit_cancel, upsert=True)
+                rows_written = counts.rows
+            elif albums:
+                rows_written = se.commit_albums(
+                    db.connect(), albums, albums_per_commit,
+                    progress=progress, cancel=commit_cancel)
+            else:
+                report = se.run_script(
+                    db.connect(), script, progress=progress, cancel=commit_cancel, upsert=upsert)
+                rows_written = sum(statement.rows for statement in report)
+            if counts and counts.updated or upsert and report:
+                # Titles were changed, so the index is loaded again.
+                catalog_index.load(db.connect())
+            else:
+                # Add the new songs to the index, it's only the rows just committed.
+                catalog_index.refresh(db.connect())
+    except se.CommitCancelled as cancelled:
+        rows_committed = cancelled.args[0] if cancelled.args else 0
+        window.write_event_value(
+            "-COMMIT-CANCELLED-", (time.perf_counter() - start, rows_committed))
+    except sqlite3.Error as error:
+        # An interrupted commit shows up as an sqlite error.
+        if commit_cancel.is_set():
+            window.write_event_value(
+                "-COMMIT-CANCELLED-", (time.perf_counter() - start, 0))
+        else:
+            window.write_event_value("-COMMIT-ERROR-", str(error))
+    else:
+        window.write_event_value(
+            "-COMMIT-DONE-", (rows_written, time.perf_counter() - start, report, counts))
+        # The titles just committed are suggested from now on.
+        updated = ()
+        if counts and counts.updated:
+            updated = {row.album_id for album in albums for row in album}
+        with suppress(sqlite3.Error):
+            title_index.refresh(updated)
+    if copies:
+        finish_copies(window, copies, album_ids)
+
+
+def committed_album_ids(albums: list, script: str) -> list:
+    """The albums being committed, read from the script if it was edited."""
+    albums = albums or se.parse_script(script)[0]
+    return sorted({row.album_id for album in albums for row in album})
+
+
+def start_copies(albums: list, script: str, upsert: bool, album_ids: list) -> list:
+    """Start committing to each of the replica databases, all at the same time.
 
     Returns:
-        bool: True if sting literals are closed and final statement has closing semicolon,
-                otherwise False.
+        list: a future for each replica, with its sdb.CopyResult.
+    """
+    if not replica_db_paths:
+        return []
+    pool = ThreadPoolExecutor(max_workers=len(replica_db_paths), thread_name_prefix="replica")
+    copies = [
+        pool.submit(sdb.commit_copy, path, albums, script, album_ids,
+            upsert, albums_per_commit, commit_cancel)
+        for path in replica_db_paths
+    ]
+    # The commits carry on, the pool just doesn't take any more.
+    pool.shutdown(wait=False)
+    return copies
+
+
+def finish_copies(window, copies: list, album_ids: list) -> None:
+    """Wait for the replicas and compare them with the main database.
+
+    Posts -COPIES-DONE- with a line for each replica.
+
+    Args:
+        window (sg.Window): the main window, the event is posted to it.
+        copies (list): the futures from start_copies().
+        album_ids (list): the albums committed.
     """
-    return sqlite3.complete_statement(script)
+    main = None
+    with suppress(sqlite3.Error), db.lock:
+        main = sdb.catalog_fingerprint(db.connect(), album_ids)
+    results = [copy.result() for copy in copies]
+    window.write_event_value("-COPIES-DONE-", sdb.compare_copies(main, results))
+
+
+def song_index_worker(window) -> None:
+    """Create the unique song index that upserts need. Runs in a worker thread.
 
+    Posts -INDEX-DONE- or -INDEX-ERROR-.
 
-def commmit_sql(connection: sqlite3.Connection) -> None:
-    """Commit the changes in the connection to the database.
-    
     Args:
-        connection (sqlite3.connection): connection to database
+        window (sg.Window): the main window, the events are posted to it.
     """
-    connection.commit()
+    try:
+        with db.lock:
+            se.create_song_index(db.connect())
+            # The copy for dry runs gets the index too.
+            schema_clone.load(db.connect())
+    except sqlite3.Error as error:
+        window.write_event_value("-INDEX-ERROR-", str(error))
+    else:
+        window.write_event_value("-INDEX-DONE-", se.SONG_INDEX)
+
+
+def commit_finished(window) -> None:
+    """Put the Commit and Cancel buttons back after a commit is done."""
+    window["Commit script"].update(disabled=False)
+    window["Cancel commit"].update(visible=False)
 
 
-def execute_sql_script(db_to_use: str, script: str) -> None:
-    """Open a connection and cursor to database, execute script
+def recover_script(window, script_name: Path, albums: list) -> None:
+    """Carry on with an unfinished script, from the rows that made it into the file.
 
     Args:
-        db_to_use (str): database to connect to.
-        script (str): script for connection to execute.
+        window (sg.Window): the main window.
+        script_name (pathlib.Path): the unfinished script file.
+        albums (list): a list of SongRows for each album recovered from the file,
+            the last one is the album that wasn't finished.
+    """
+    script_buffer.load(albums)
+    # Rewrites the file without a row that was only half written.
+    script_buffer.open_file(script_name)
+    journal.start(script_name, script_buffer)
+    window["-SCRIPT-"].update(script_buffer.text())
+    window["Next Song"].update(disabled=False)
+    window["Last Song"].update(disabled=False)
+    if script_buffer.rows:
+        last_row = script_buffer.rows.last()
+        album_side, song_number = se.split_song_number(last_row.song_number)
+        window["-ALBUM-ID-"].update(last_row.album_id)
+        window["-SONG-NUMBER-"].update(song_number + 1)
+        if album_side:
+            window["-SIDE-"].update(album_side)
+            window["-RB-LP-"].update(value=True)
+            window.write_event_value("-RB-LP-", True)
+    rows = sum(len(album) for album in albums)
+    show_message(window, "-INFO-", 
+        f"Recovered {rows} rows in {len(albums)} albums from: \n{script_name}"
+        "\n\nEnter the next Song Title.")
+    window["-TITLE-"].set_focus()
+
+
+def resume_session(window, session: dict) -> str:
+    """Carry on with the session the journal was replayed from, after a crash.
+
+    The rows are already back in script_buffer, the script file is written
+    again from them and the inputs are put back as they were.
+
+    Args:
+        window (sg.Window): the main window.
+        session (dict): from sj.replay, the script file and the inputs.
+
+    Returns:
+        str: name of the script file, the folder is made the current one.
     """
-    with closing(sqlite3.connect(db_to_use)) as connection:
-        connection.execute(script)
-        commmit_sql(connection)
+    script_path = Path(session["script"])
+    inputs = session["inputs"]
+    cd(script_path.parent)
+    # The journal's snapshot only has the live rows, so the buffer starts over
+    # from them too, without deleted slots or history a later record could point at.
+    script_buffer.load(
+        [*script_buffer.queue.albums, list(script_buffer.rows)], script_buffer.closed)
+    # Rewrites the file, which may have stopped part way through a row.
+    script_buffer.open_file(script_path)
+    journal.inputs = inputs
+    journal.start(script_path, script_buffer)
+
+    window["-FOLDER-"].update(str(script_path))
+    window["-NUMBER-"].update(inputs.get("songs", "10"))
+    last_row = script_buffer.rows.last()
+    window["-ALBUM-ID-"].update(last_row.album_id if last_row else inputs.get("album_id", ""))
+    if inputs.get("lp"):
+        window["-RB-LP-"].update(value=True)
+        window.write_event_value("-RB-LP-", True)
+    show_rows_changed(window, {"-NUMBER-": inputs.get("songs", "10")})
+    song_number = window["-SONG-NUMBER-"].get()
+    show_message(window, "-INFO-", 
+        f"Carrying on with: \n{script_path}\n\n{len(script_buffer.queue)} albums queued, "
+        f"the next song is {window['-SIDE-'].get() + '-' if inputs.get('lp') else ''}{song_number}.")
+    return script_path.name
+
+
+def start_next_album(window) -> None:
+    """Queue the finished album and set the inputs up for the next one.
 
+    Args:
+        window (sg.Window): the main window.
+    """
+    show_script_row(window, script_buffer.next_album())
+    queued = len(script_buffer.queue)
+    window["-SONG-NUMBER-"].update(1)
+    window["-SIDE-"].update("A")
+    window["-TITLE-"].update("")
+    window["Next Album"].update(disabled=True)
+    window["Next Song"].update(disabled=False)
+    window["Copy script"].update(disabled=True)
+    window["Commit script"].update(disabled=True)
+    show_message(window, "-STATUS-", 
+        f"{queued} albums, {script_buffer.queue.row_count()} songs queued to commit.")
+    show_message(window, "-INFO-", "\nNext album:\nUpdate Album ID number and # of songs.")
+    window["-ALBUM-ID-"].set_focus()
+    window["-ALBUM-ID-"].update(select=True)
+
+
+def show_rows_changed(window, values: dict) -> None:
+    """Show the script and set the inputs up again after an undo, redo or edit.
 
-def allow_edits() -> None:
+    Args:
+        window (sg.Window): the main window.
+        values (dict): values from the window, for the # of songs.
+    """
+    window["-SCRIPT-"].update(script_buffer.text())
+    last_row = script_buffer.rows.last()
+    if last_row is None:
+        window["-SONG-NUMBER-"].update(1)
+    else:
+        album_side, song_number = se.split_song_number(last_row.song_number)
+        window["-SONG-NUMBER-"].update(song_number + 1)
+        if album_side:
+            window["-SIDE-"].update(album_side)
+    closed = script_buffer.closed
+    last_song_next = len(script_buffer.rows) >= int(values["-NUMBER-"] or 0) - 1
+    window["Next Song"].update(disabled=closed or last_song_next)
+    window["Last Song"].update(disabled=closed or not last_song_next)
+    window["Next Album"].update(disabled=not closed)
+    window["Copy script"].update(disabled=not closed)
+    window["Commit script"].update(disabled=True)
+    undo_redo = ("Undo" if script_buffer.can_undo else "", "Redo" if script_buffer.can_redo else "")
+    show_message(window, "-STATUS-", 
+        f"{len(script_buffer.rows)} songs in this album. {' / '.join(filter(None, undo_redo))}")
+    window["-TITLE-"].set_focus()
+
+
+def allow_edits(window) -> None:
     """Enables editing of the script in the window.
 
     Updates the necessary window elements to allow editing of the script.
+
+    Args:
+        window (sg.Window): the main window.
     """
     window["-SCRIPT-"].update(disabled=False)
     window["-SCRIPT-"].set_focus()
     window["-SCRIPT-"].set_cursor(cursor=None, cursor_color="light green")
     window["-STATUS-"].update("Script open for editing.")
     window["Copy script"].update(disabled=False)
+    # Check it all once, after that only the lines that are edited.
+    script_validator.load(window["-SCRIPT-"].Widget.get("1.0", "end-1c"))
+    show_problems(window)
 
 
-# Declare some sg aliases.
-B = sg.Button
-CB = sg.Checkbox
-Frame = sg.Frame
-In = sg.Input
-RB = sg.Radio
-T = sg.Text
-
-# Make it whatever you want.
-# sg.theme('DarkTeal6')
-sg.theme("DarkGrey4")
-# sg.theme('DarkGrey11')
-sg.set_options(tooltip_font="Calibri 12")
-
-# Custom titlebar.
-titlebar = sg.Titlebar(title="SQL Song Scripter", text_color="#303030", icon=title_icon)
-
-# Custom menu. Alt+key does not work with this one.
-menu_layout = [
-    ["&File", ["&Open     Ctrl-O", "&Save      Ctrl-S", "&Properties", "E&xit"]],
-    ["&Edit", ["Edit Script", "Special", "Normal", ["Normal1", "Normal2"], "Undo"]],
-    ["&Actions", ["C&opy script", "&Commit script", "C&lear", "&Delete", "&Next"]],
-    ["&Help", ["&Help", "&About..."]]
-]
+def revalidate_script(window) -> None:
+    """Check the lines that were just edited in -SCRIPT-, after each key.
 
-information_frame = [
-    Frame("Information",
-        [
-            [sg.Text("",
-                    size=(48, 5),
-                    justification="l",
-                    background_color="#303030",
-                    key="-INFO-",
-                    )
-            ]
-        ],
-        background_color="#303030",
-        expand_x=True,
-        relief="flat",
-        font=("Calibri", 14, "bold"),
-        pad=((0, 20), (20, 5)),
-    )
-]
+    If the number of lines is the same only the line with the cursor changed,
+    otherwise the validator works out which lines did.
 
-# For showing the lines of the script.
-multiline_frame = [
-    Frame("Script \n",
-        [
-            [
-                sg.Multiline(
-                    default_text=".",
-                    size=(47, 18),
-                    disabled=True,
-                    border_width=0,
-                    autoscroll=True,
-                    justification="l",
-                    focus=False,
-                    background_color="#303030",
-                    text_color="#e9e8e4",
-                    key="-SCRIPT-",
-                    sbar_trough_color="#303030",
-                    sbar_background_color="#303030",
-                    sbar_arrow_color="#9a9b94",
-                    sbar_frame_color="#303030",
-                    sbar_relief="flat",
-                ),
-            ]
-        ],
-        background_color="#303030",
-        font=("Calibri", 14, "bold"),
-        relief="flat",
-        expand_x=True,
-        pad=((0, 20), (20, 15)),
-    )
-]
+    Args:
+        window (sg.Window): the main window.
+    """
+    widget = window["-SCRIPT-"].Widget
+    line_count = int(widget.index("end-1c").split(".")[0])
+    line = int(widget.index("insert").split(".")[0])
+    if line_count == len(script_validator.lines):
+        changed = script_validator.update_line(line - 1, widget.get(f"{line}.0", f"{line}.end"))
+        if not changed:
+            return
+    else:
+        script_validator.update(widget.get("1.0", "end-1c"))
+        changed = None
+    show_problems(window, changed)
+
+
+def show_problems(window, changed: list = None) -> None:
+    """Highlight the lines of -SCRIPT- with problems, and show the first one.
 
-radio_frame = [
-    Frame("Album Media",
-        [
+    Args:
+        window (sg.Window): the main window.
+        changed (list, optional): 0 based line numbers to highlight again.
+            Defaults to None for all of them.
+    """
+    widget = window["-SCRIPT-"].Widget
+    problems = script_validator.problems
+    if changed is None:
+        widget.tag_remove("problem", "1.0", "end")
+        changed = problems
+    for index in changed:
+        widget.tag_remove("problem", f"{index + 1}.0", f"{index + 1}.end")
+        if index in problems:
+            widget.tag_add("problem", f"{index + 1}.0", f"{index + 1}.end")
+    if problems:
+        first = min(problems)
+        show_message(window, "-STATUS-", 
+            f"Line {first + 1}: {problems[first]}  ({len(problems)} rows to check)", "orange")
+    else:
+        show_message(window, "-STATUS-", "Script open for editing, the rows look right.")
+
+
+# Handlers for the inputs' events, called with (window, values) once the typing stops.
+input_handlers = {
+    "-TITLE-": title_typed,
+    "-ALBUM-ID-": album_id_typed,
+    "-NUMBER-": song_count_typed,
+    "-ALBUM-SEARCH-": album_search_typed,
+    "-FOLDER-": folder_chosen,
+}
+
+
+def make_window() -> "sg.Window":
+    """Build the layout and the window, with the key bindings.
+
+    Returns:
+        sg.Window: the finalized main window.
+    """
+    # Declare some sg aliases.
+    B = sg.Button
+    CB = sg.Checkbox
+    Frame = sg.Frame
+    In = sg.Input
+    RB = sg.Radio
+    T = sg.Text
+
+    # Make it whatever you want.
+    # sg.theme('DarkTeal6')
+    sg.theme("DarkGrey4")
+    # sg.theme('DarkGrey11')
+    sg.set_options(tooltip_font="Calibri 12")
+
+    # Custom titlebar.
+    titlebar = sg.Titlebar(title="SQL Song Scripter", text_color="#303030", icon=title_icon)
+
+    # Custom menu. Alt+key does not work with this one.
+    menu_layout = [
+        ["&File", ["&Open     Ctrl-O", "&Save      Ctrl-S", "&Properties", "E&xit"]],
+        ["&Edit", ["Edit Script", "Edit Last Title", "Delete Last Row", "Special", "Normal",
+            ["Normal1", "Normal2"], "Undo", "Redo"]],
+        ["&Actions", ["Scan folder", "Import tracklist", "Create song index", "C&opy script", "&Commit script", "C&lear", "&Delete", "&Next"]],
+        ["&Help", ["&Help", "&About..."]]
+    ]
+
+    information_frame = [
+        Frame("Information",
             [
-                RB( "Single CD",
-                    "media",
-                    default=True,
-                    enable_events=True,
-                    key="-RB-CD-",
-                    pad=((0, 30), (0, 0)),
-                    background_color="#3a3a3a",
-                ),
-                RB("LP or multiple CDs",
-                    "media",
-                    enable_events=True,
-                    key="-RB-LP-",
-                    background_color="#3a3a3a",
-                ),
+                [sg.Text("",
+                        size=(48, 5),
+                        justification="l",
+                        background_color="#303030",
+                        key="-INFO-",
+                        )
+                ]
             ],
-        ],
-        title_location=sg.TITLE_LOCATION_TOP,
-        background_color="#3a3a3a",
-        relief="flat",
-        element_justification="center",
-        expand_x=True,
-        font=(
-            "Calibri",
-            14,
-            "bold",
-        ),
-        pad=((20, 20), (0, 10)),
-    )
-]
-
-# Input for filename and folder to save to.
-filename_input_column = [
-    [
-        In("Filename...",
-            disabled=True,
-            use_readonly_for_disable=False,
-            enable_events=True,
-            key="-FOLDER-",
-        ),
-    ],
-]
-
-filename_button_column = [
-    [
-        sg.SaveAs(
-            button_text="  Set Filename...   ",
-            file_types=(("SQL", ".sql"),),
-            enable_events=True,
-            target="-FOLDER-",
-            auto_size_button=False,
+            background_color="#303030",
+            expand_x=True,
+            relief="flat",
+            font=("Calibri", 14, "bold"),
+            pad=((0, 20), (20, 5)),
         )
-    ],
-]
-filename_frame = [
-    Frame("File Info \n",
-        [
+    ]
+
+    # For showing the lines of the script.
+    multiline_frame = [
+        Frame("Script \n",
             [
-                sg.Column(
-                    filename_input_column,
-                    element_justification="right",
-                    pad=((20, 0), (0, 0)),
-                    background_color="#3a3a3a",
-                ),
-                sg.Column(
-                    filename_button_column,
-                    element_justification="right",
-                    pad=((0, 20), (0, 0)),
-                    background_color="#3a3a3a",
-                ),
+                [
+                    sg.Multiline(
+                        default_text=".",
+                        size=(47, 18),
+                        disabled=True,
+                        border_width=0,
+                        autoscroll=True,
+                        justification="l",
+                        focus=False,
+                        background_color="#303030",
+                        text_color="#e9e8e4",
+                        key="-SCRIPT-",
+                        sbar_trough_color="#303030",
+                        sbar_background_color="#303030",
+                        sbar_arrow_color="#9a9b94",
+                        sbar_frame_color="#303030",
+                        sbar_relief="flat",
+                    ),
+                ]
             ],
+            background_color="#303030",
+            font=("Calibri", 14, "bold"),
+            relief="flat",
+            expand_x=True,
+            pad=((0, 20), (20, 15)),
+        )
+    ]
+
+    radio_frame = [
+        Frame("Album Media",
             [
-                B("Create Script",
-                    expand_x=True,
-                    enable_events=True,
-                    pad=((20, 20), (20, 20)),
-                )
+                [
+                    RB( "Single CD",
+                        "media",
+                        default=True,
+                        enable_events=True,
+                        key="-RB-CD-",
+                        pad=((0, 30), (0, 0)),
+                        background_color="#3a3a3a",
+                    ),
+                    RB("LP or multiple CDs",
+                        "media",
+                        enable_events=True,
+                        key="-RB-LP-",
+                        background_color="#3a3a3a",
+                    ),
+                ],
             ],
+            title_location=sg.TITLE_LOCATION_TOP,
+            background_color="#3a3a3a",
+            relief="flat",
+            element_justification="center",
+            expand_x=True,
+            font=(
+                "Calibri",
+                14,
+                "bold",
+            ),
+            pad=((20, 20), (0, 10)),
+        )
+    ]
+
+    # Input for filename and folder to save to.
+    filename_input_column = [
+        [
+            In("Filename...",
+                disabled=True,
+                use_readonly_for_disable=False,
+                enable_events=True,
+                key="-FOLDER-",
+            ),
+        ],
+    ]
+
+    filename_button_column = [
+        [
+            sg.SaveAs(
+                button_text="  Set Filename...   ",
+                file_types=(("SQL", ".sql"),),
+                enable_events=True,
+                target="-FOLDER-",
+                auto_size_button=False,
+            )
+        ],
+    ]
+    filename_frame = [
+        Frame("File Info \n",
             [
-                T("",
-                    background_color="#3a3a3a",
-                )
+                [
+                    sg.Column(
+                        filename_input_column,
+                        element_justification="right",
+                        pad=((20, 0), (0, 0)),
+                        background_color="#3a3a3a",
+                    ),
+                    sg.Column(
+                        filename_button_column,
+                        element_justification="right",
+                        pad=((0, 20), (0, 0)),
+                        background_color="#3a3a3a",
+                    ),
+                ],
+                [
+                    B("Create Script",
+                        expand_x=True,
+                        enable_events=True,
+                        pad=((20, 20), (20, 20)),
+                    )
+                ],
+                [
+                    T("",
+                        background_color="#3a3a3a",
+                    )
+                ],
+                radio_frame,
             ],
-            radio_frame,
+            element_justification="center",
+            relief="flat",
+            background_color="#3a3a3a",
+            expand_x=True,
+            font=("Calibri", 14, "bold"),
+            pad=((20, 20), (10, 10)),
+        )
+    ]
+
+    # Inputs for song fields.
+    text_column = [
+        [
+            T("Album ID:",
+                background_color="#3a3a3a",
+            ),
+        ],
+        [
+            T("Song number:",
+                background_color="#3a3a3a",
+            ),
+        ],
+        [
+            T("CD # or LP side:",
+                background_color="#3a3a3a",
+                text_color="#3a3a3a",
+                key="-SIDE-TEXT-",
+            )
+        ],
+        [
+            T("Song Title:",
+                background_color="#3a3a3a",
+            ),
+        ],
+    ]
+    input_column = [
+        [
+            In("10", size=5, enable_events=True, justification="center", key="-ALBUM-ID-"),
+            T("# of songs:", background_color="#3a3a3a", pad=((45, 15), (0, 0))),
+            In("10", size=5, justification="center", enable_events=True, key="-NUMBER-"),
+        ],
+        [
+            In(1,
+                size=5,
+                justification="center",
+                disabled=True,
+                use_readonly_for_disable=False,
+                background_color="#3a3a3a",
+                key="-SONG-NUMBER-",
+            ),
+            CB("Reset to 1",
+                enable_events=True,
+                visible=False,
+                disabled=True,
+                background_color="#3a3a3a",
+                key="-CB-RESET-",
+            ),
+        ],
+        [
+            In("A",
+                size=5,
+                justification="center",
+                key="-SIDE-",
+                border_width=0,
+                background_color="#3a3a3a",
+                text_color="#3a3a3a",
+            ),
+        ],
+        [
+            In("The Song Name", 
+                enable_events=True, 
+                key="-TITLE-")
+        ],
+        [
+            # Titles already in the database, shown while one is typed.
+            sg.pin(sg.Listbox([],
+                size=(45, 5),
+                visible=False,
+                enable_events=True,
+                no_scrollbar=True,
+                background_color="#303030",
+                text_color="#e9e8e4",
+                key="-SUGGEST-",
+            ))
+        ],
+    ]
+    song_columns = (
+        [
+            sg.Column(
+                text_column,
+                element_justification="right",
+                background_color="#3a3a3a",
+                key="text_column",
+            ),
+            sg.Column(
+                input_column,
+                element_justification="left",
+                background_color="#3a3a3a",
+                key="input_column",
+            ),
         ],
-        element_justification="center",
-        relief="flat",
-        background_color="#3a3a3a",
-        expand_x=True,
-        font=("Calibri", 14, "bold"),
-        pad=((20, 20), (10, 10)),
     )
-]
-
-# Inputs for song fields.
-text_column = [
-    [
-        T("Album ID:",
-            background_color="#3a3a3a",
-        ),
-    ],
-    [
-        T("Song number:",
-            background_color="#3a3a3a",
-        ),
-    ],
-    [
-        T("CD # or LP side:",
+    song_frame = [
+        Frame("Song Info \n",
+            [
+                [
+                    T("Find album:",
+                        background_color="#3a3a3a",
+                    ),
+                    In("",
+                        size=30,
+                        enable_events=True,
+                        tooltip=" Type the start of words of the album title or artist, \n"
+                            " then pick the album, Down arrow goes to the list. ",
+                        key="-ALBUM-SEARCH-",
+                    ),
+                ],
+                [
+                    sg.pin(sg.Listbox([],
+                        size=(45, 6),
+                        visible=False,
+                        enable_events=True,
+                        background_color="#303030",
+                        text_color="#e9e8e4",
+                        key="-ALBUM-LIST-",
+                    ))
+                ],
+                [sg.Column(
+                        song_columns,
+                        pad=((0, 0), (0, 30)),
+                        background_color="#3a3a3a",
+                        key="cd",
+                    )
+                ],
+                [B("Next Song",
+                        expand_x=True,
+                        disabled=True,
+                        enable_events=True,
+                        bind_return_key=True,
+                        pad=((20, 20), (10, 10)),
+                    )
+                ],
+                [B("Last Song",
+                        expand_x=True,
+                        enable_events=True,
+                        pad=((20, 20), (10, 10)),
+                    )
+                ],
+                [B("Next Album",
+                        expand_x=True,
+                        disabled=True,
+                        enable_events=True,
+                        pad=((20, 20), (0, 20)),
+                    )
+                ],
+            ],
+            relief="flat",
+            element_justification="center",
             background_color="#3a3a3a",
-            text_color="#3a3a3a",
-            key="-SIDE-TEXT-",
+            expand_x=True,
+            font=("Calibri", 14, "bold"),
+            pad=((20, 20), (20, 0)),
         )
-    ],
-    [
-        T("Song Title:",
-            background_color="#3a3a3a",
-        ),
-    ],
-]
-input_column = [
-    [
-        In("10", size=5, enable_events=True, justification="center", key="-ALBUM-ID-"),
-        T("# of songs:", background_color="#3a3a3a", pad=((45, 15), (0, 0))),
-        In("10", size=5, justification="center", enable_events=True, key="-NUMBER-"),
-    ],
-    [
-        In(1,
-            size=5,
-            justification="center",
-            disabled=True,
-            use_readonly_for_disable=False,
-            background_color="#3a3a3a",
-            key="-SONG-NUMBER-",
-        ),
-        CB("Reset to 1",
-            enable_events=True,
-            visible=False,
-            disabled=True,
-            background_color="#3a3a3a",
-            key="-CB-RESET-",
-        ),
-    ],
-    [
-        In("A",
-            size=5,
-            justification="center",
-            key="-SIDE-",
-            border_width=0,
-            background_color="#3a3a3a",
-            text_color="#3a3a3a",
-        ),
-    ],
-    [
-        In("The Song Name", 
-            enable_events=True, 
-            key="-TITLE-")
-    ],
-]
-song_columns = (
-    [
-        sg.Column(
-            text_column,
-            element_justification="right",
-            background_color="#3a3a3a",
-            key="text_column",
-        ),
-        sg.Column(
-            input_column,
-            element_justification="left",
-            background_color="#3a3a3a",
-            key="input_column",
-        ),
-    ],
-)
-song_frame = [
-    Frame("Song Info \n",
-        [
-            [sg.Column(
-                    song_columns,
-                    pad=((0, 0), (0, 30)),
-                    background_color="#3a3a3a",
-                    key="cd",
-                )
+    ]
+
+    input_frame = [
+        Frame("",
+            [
+                filename_frame,
+                song_frame,
             ],
-            [B("Next Song",
-                    expand_x=True,
-                    disabled=True,
-                    enable_events=True,
-                    bind_return_key=True,
-                    pad=((20, 20), (10, 10)),
-                )
+            relief="flat",
+            pad=((0, 0), (0, 0))        
+        )
+    ]
+
+    info_frame = [
+        Frame("",
+            [
+                information_frame,
+                multiline_frame,
             ],
-            [B("Last Song",
-                    expand_x=True,
-                    enable_events=True,
-                    pad=((20, 20), (10, 20)),
-                )
+            relief="flat",
+            pad=((20, 20), (0, 0))
+        )
+    ]
+
+    # Songs already in the database, a page at a time.
+    browser_frame = [
+        Frame("Catalog \n",
+            [
+                [
+                    CB("This album only",
+                        enable_events=True,
+                        background_color="#303030",
+                        key="-BROWSE-ALBUM-",
+                    ),
+                    B("Top", size=(6, 1), key="-BROWSE-TOP-"),
+                    B("End", size=(6, 1), key="-BROWSE-END-"),
+                ],
+                [
+                    sg.Table(
+                        values=[],
+                        headings=["ID", "Album", "No.", "Title"],
+                        col_widths=[7, 6, 4, 28],
+                        auto_size_columns=False,
+                        justification="l",
+                        num_rows=22,
+                        background_color="#303030",
+                        text_color="#e9e8e4",
+                        header_background_color="#3a3a3a",
+                        expand_y=True,
+                        key="-BROWSER-",
+                    ),
+                ],
+                [
+                    T("",
+                        background_color="#303030",
+                        key="-BROWSE-STATUS-",
+                    )
+                ],
             ],
-        ],
-        relief="flat",
-        element_justification="center",
-        background_color="#3a3a3a",
-        expand_x=True,
-        font=("Calibri", 14, "bold"),
-        pad=((20, 20), (20, 0)),
-    )
-]
+            background_color="#303030",
+            font=("Calibri", 14, "bold"),
+            relief="flat",
+            pad=((0, 20), (20, 15)),
+        )
+    ]
 
-input_frame = [
-    Frame("",
+    # * Making the final columns
+    file_column = sg.Column(
         [
-            filename_frame,
-            song_frame,
+            input_frame,
         ],
-        relief="flat",
-        pad=((0, 0), (0, 0))        
+        pad=((20, 0), (0, 0)),
     )
-]
 
-info_frame = [
-    Frame("",
+    info_column = sg.Column(
         [
-            information_frame,
-            multiline_frame,
+            info_frame
         ],
-        relief="flat",
-        pad=((20, 20), (0, 0))
+        pad=(0, 0),
     )
-]
 
-# * Making the final two columns
-file_column = sg.Column(
-    [
-        input_frame,
-    ],
-    pad=((20, 0), (0, 0)),
-)
-
-info_column = sg.Column(
-    [
-        info_frame
-    ],
-    pad=(0, 0),
-)
-
-whole_thing = [
-    Frame("",
+    browser_column = sg.Column(
         [
-            [file_column, info_column],
+            browser_frame
         ],
-        relief="flat",
         pad=(0, 0),
+        expand_y=True,
     )
-]
 
-status_bar = (
-        [T("",
-            expand_x=True,
-            pad=((40, 40), (0, 10)),
-            background_color="#3a3a3a",
-            text_color="light green",
-            key="-STATUS-",
-        ),
-        sg.Checkbox("Edit script", 
-            pad=((0, 45), (0, 0)), 
-            enable_events=True, 
-            key="-CB-EDIT-"
+    whole_thing = [
+        Frame("",
+            [
+                [file_column, info_column, browser_column],
+            ],
+            relief="flat",
+            pad=(0, 0),
         )
-        ],
-)
-
-# The final layout is fairly simple.
-# *Layout and window with custom titlebar and custom menu.
-layout = [
-    [titlebar],
-    [sg.MenubarCustom(menu_layout, bar_background_color="#3a3a3a", k="-MENUBAR-")],
-    [whole_thing],
-    sf.action_buttons_frame("Actions"),
-    [status_bar],
-    # for testing, turn on and off when needed, remove when no longer needed.
-    # [sg.Output(expand_x=True, size=(47, 15), echo_stdout_stderr = True,)],
-]
+    ]
+
+    status_bar = (
+            [T("",
+                expand_x=True,
+                pad=((40, 40), (0, 10)),
+                background_color="#3a3a3a",
+                text_color="light green",
+                key="-STATUS-",
+            ),
+            sg.Checkbox("Edit script", 
+                pad=((0, 45), (0, 0)), 
+                enable_events=True, 
+                key="-CB-EDIT-"
+            )
+            ],
+    )
 
-window = sg.Window(
-    "",
-    layout,
-    auto_size_buttons=False,
-    default_button_element_size=(12, 1),
-    button_color="#52524e",
-    font="Calibri 14",
-    return_keyboard_events=True,
-    resizable=True,
-    finalize=True,
-)
-
-# Alt key bindings
-window.bind("<Alt_L><n>", "Alt-n")
-window.bind("<Alt_R><n>", "Alt-n")
-NEXT = window["Next Song"]
-NEXT.Widget.configure(underline=0)
-
-window.bind("<Alt_L><l>", "Alt-l")
-window.bind("<Alt_R><l>", "Alt-l")
-LAST = window["Last Song"]
-LAST.Widget.configure(underline=0)
-
-window.bind("<Alt_L><r>", "Alt-r")
-window.bind("<Alt_R><r>", "Alt-r")
-CREATE = window["Create Script"]
-CREATE.Widget.configure(underline=1)
-
-window.bind("<Alt_L><o>", "Alt-o")
-window.bind("<Alt_R><o>", "Alt-o")
-COPY = window["Copy script"]
-COPY.Widget.configure(underline=1)
-
-window.bind("<Alt_L><c>", "Alt-c")
-window.bind("<Alt_R><c>", "Alt-c")
-COMMIT = window["Commit script"]
-COMMIT.Widget.configure(underline=0)
-
-window.bind("<Alt_L><e>", "Alt-e")
-window.bind("<Alt_R><e>", "Alt-e")
-CLEAR = window['Clear inputs']
-CLEAR.Widget.configure(underline=2)
-
-# Ctrl key bindings
-window.bind("<Control-KeyPress-o>", "CTRL-O")  # Open.
-window.bind("<Control-KeyPress-s>", "CTRL-S")  # Save.
-window.bind("<Control-KeyPress-x>", "CTRL-X")  # Exit app.
-
-while True:  # event Loop
-    event, values = window.read()
-    if event in (sg.WIN_CLOSED, "Exit", "CTRL-X", "F4:115"):
-        break
-
-    # sf.print_inputs(values)  # for testing, remove when done.
-
-    # Use enter or return key for any button that has focus.
-    if event in ("\r", QT_ENTER_KEY1, QT_ENTER_KEY2):  # Check for ENTER key.
-        # go find element with Focus
-        elem = window.find_element_with_focus()
-        if (elem is not None and elem.Type == sg.ELEM_TYPE_BUTTON):
-            # If it's a button element, click it
-            elem.Click()
-
-    if event == "-FOLDER-":
-        show_message("-INFO-", "\nCreate the script")
-
-    # Radio button events:
-    if event == "-RB-CD-":
-        window["-SIDE-TEXT-"].update(
-            text_color="#3a3a3a",
-        )
-        window["-SIDE-"].update(
-            background_color="#3a3a3a",
-            text_color="#3a3a3a",
-        )
-        window["-CB-RESET-"].update(
-            visible=False,
-            disabled=True,
-        )
+    # The final layout is fairly simple.
+    # *Layout and window with custom titlebar and custom menu.
+    layout = [
+        [titlebar],
+        [sg.MenubarCustom(menu_layout, bar_background_color="#3a3a3a", k="-MENUBAR-")],
+        [whole_thing],
+        sf.action_buttons_frame("Actions"),
+        [status_bar],
+        # for testing, turn on and off when needed, remove when no longer needed.
+        # [sg.Output(expand_x=True, size=(47, 15), echo_stdout_stderr = True,)],
+    ]
+
+    window = sg.Window(
+        "",
+        layout,
+        auto_size_buttons=False,
+        default_button_element_size=(12, 1),
+        button_color="#52524e",
+        font="Calibri 14",
+        return_keyboard_events=True,
+        resizable=True,
+        finalize=True,
+    )
 
-    if event == "-RB-LP-":
-        window["-SIDE-TEXT-"].update(text_color="white")
-        window["-SIDE-"].update(background_color="#d4d6c8")
-        window["-SIDE-"].set_focus()
-        window["-CB-RESET-"].update(
-            visible=True, 
-            disabled=False
-        )
+    # Alt key bindings
+    window.bind("<Alt_L><n>", "Alt-n")
+    window.bind("<Alt_R><n>", "Alt-n")
+    NEXT = window["Next Song"]
+    NEXT.Widget.configure(underline=0)
+
+    window.bind("<Alt_L><l>", "Alt-l")
+    window.bind("<Alt_R><l>", "Alt-l")
+    LAST = window["Last Song"]
+    LAST.Widget.configure(underline=0)
+
+    window.bind("<Alt_L><a>", "Alt-a")
+    window.bind("<Alt_R><a>", "Alt-a")
+    NEXT_ALBUM = window["Next Album"]
+    NEXT_ALBUM.Widget.configure(underline=5)
+
+    window.bind("<Alt_L><r>", "Alt-r")
+    window.bind("<Alt_R><r>", "Alt-r")
+    CREATE = window["Create Script"]
+    CREATE.Widget.configure(underline=1)
+
+    window.bind("<Alt_L><o>", "Alt-o")
+    window.bind("<Alt_R><o>", "Alt-o")
+    COPY = window["Copy script"]
+    COPY.Widget.configure(underline=1)
+
+    window.bind("<Alt_L><c>", "Alt-c")
+    window.bind("<Alt_R><c>", "Alt-c")
+    COMMIT = window["Commit script"]
+    COMMIT.Widget.configure(underline=0)
+
+    window.bind("<Alt_L><e>", "Alt-e")
+    window.bind("<Alt_R><e>", "Alt-e")
+    CLEAR = window['Clear inputs']
+    CLEAR.Widget.configure(underline=2)
+
+    # Ctrl key bindings
+    window.bind("<Control-KeyPress-o>", "CTRL-O")  # Open.
+    window.bind("<Control-KeyPress-s>", "CTRL-S")  # Save.
+    # Rows with problems are highlighted as the script is edited.
+    window["-SCRIPT-"].bind("<KeyRelease>", "+KEY")
+    window["-SCRIPT-"].Widget.tag_configure("problem", background="#6b2b2b")
+    window.bind("<Control-KeyPress-x>", "CTRL-X")  # Exit app.
+    watch_browser_scroll(window)
+    # Down arrow in the title goes to the suggestions, and in the album search to the albums.
+    window["-TITLE-"].bind("<Down>", "+DOWN")
+    window["-ALBUM-SEARCH-"].bind("<Down>", "+DOWN")
+    # Double click an album to close the picker, it closes when the title is typed in too.
+    window["-ALBUM-LIST-"].bind("<Double-Button-1>", "+DONE")
+    window["-TITLE-"].bind("<FocusIn>", "+FOCUS")
+
+    return window
+
+
+def make_trace_window() -> "sg.Window":
+    """Debug panel with the tracer's p50/p95 times per event, only made when tracing.
 
-    #  Checkbox events:
-    elif event == "-CB-RESET-":
-        window["-SONG-NUMBER-"].update(disabled=False)
-        window["-SONG-NUMBER-"].update(1)
-        window["-SONG-NUMBER-"].update(disabled=True)
-        window["-SIDE-"].set_focus()
-        window["-SIDE-"].update(select=True)
-        window["-CB-RESET-"].update(value=False)
-
-    # Button events:
-    if event in ["Create Script", "Alt-r"]:
-        # Catch blank inputs, uses named expression (walrus) assignment. This is not working now.
-        if empty_input := sf.check_inputs(values):
-            sf.update_if_empty(window, empty_input)
-        else:
-            script_path = Path(values["-FOLDER-"])
-            script_folder = script_path.parent
-            script_name = script_path.name
-
-            cd(script_folder)
-            # Write the necessary first lines for the script.
-            with open(script_name, "w") as file:
-                file.write(
-                    "INSERT INTO catalog_song (song_title, song_number, album_id)"
-                )
-                file.write("\n\nVALUES")
-            show_message("-INFO-", 
-                f'"{script_name}"  script created.\n\nUpdate Album ID number and # of songs.\nEnter Song Title.',)
-            window["-ALBUM-ID-"].set_focus()
-            window["-ALBUM-ID-"].update(select=True, background_color="lightgrey")
-            window["Next Song"].update(disabled=False)
-            show_script(script_name)
-
-    if event in ("Next Song", "Next", "Alt-n"):
-        # Catch blank inputs, using named expression (walrus) assignment.
-        if empty_input := sf.check_inputs(values):
-            sf.update_if_empty(window, empty_input)
-        else:
-            song_number = get_song_inputs()[2]
-            song_row = create_song_row()
-            # Put double quotes around each part of the row and a comma at the end,
-            # for a format an sql database can recognize.
-            song_row = '("' + '", "'.join(map(str, song_row)) + '"),'
-            # Append the new row to the file.
-            with open(script_name, "a") as file:
-                file.write(f"\n {song_row}")
-            # Add 1 to the song_number.
-            song_number += 1
-            song_rows = int(values["-NUMBER-"])
-            row_counter += 1
-
-            window["-SONG-NUMBER-"].update(song_number)
-            window["-TITLE-"].set_focus()
-            window["-TITLE-"].update(select=True, background_color="lightgrey")
-
-            if row_counter == song_rows - 1:
-                window["Next Song"].update(disabled=True)
-                window["Last Song"].update(disabled=False)
-                # window['Last Song'].set_focus()
+    Returns:
+        sg.Window: the finalized panel, it's updated but never read.
+    """
+    layout = [
+        [sg.Multiline(size=(62, 18), font=("Courier New", 10), disabled=True,
+            no_scrollbar=True, key="-TRACE-")]
+    ]
+    return sg.Window("Event timings", layout, finalize=True, keep_on_top=True,
+        disable_close=True, location=(0, 0))
 
-            show_script(script_name)
 
-    elif event in ("Last Song", "Alt-l"):
-        # Catch empty inputs.
-        if empty_input := sf.check_inputs(values):
-            sf.update_if_empty(window, empty_input)
+def start_tracer(window) -> st.EventTracer:
+    """Make the tracer if SQL_SCRIPTER_TRACE is set, and hook it up to the window.
+
+    Args:
+        window (sg.Window): the main window.
+
+    Returns:
+        st.EventTracer: the tracer, disabled if tracing isn't turned on.
+    """
+    tracer = st.EventTracer.from_environment(Path(__file__).parent)
+    tracer.watch_updates(window)
+    # What the handlers do on the files and the database, from the main thread.
+    tracer.watch_io(sf, "open_text_file", "delete_file")
+    tracer.watch_io(script_buffer, "open_file", "write", "checkpoint", "save",
+        "rows_changed", "close_file")
+    tracer.watch_io(schema_clone, "dry_run")
+    tracer.watch_io(journal, "record", "sync", "write_snapshot")
+    return tracer
+
+
+def main() -> None:
+    """Show the window and run the event loop until the app is closed."""
+    window = make_window()
+    tracer = start_tracer(window)
+    trace_window = make_trace_window() if tracer.enabled else None
+    trace_shown = 0.0
+
+    # For counting rows as they're added to script,
+    # to know when to disable Next Song button..
+    row_counter = 0
+    # Set when the script text no longer matches the rows,
+    # after editing or opening a script, then the text is committed instead.
+    script_edited = False
+    # The script as it was when it was checked, only that gets committed.
+    checked_script = ""
+    checked_hash = None
+    # Makes the rows while a folder is being scanned, and the slots of the rows it added.
+    scan_builder = None
+    scan_slots = []
+    # Holds back the inputs' events while they're being typed in.
+    debouncer = sev.Debouncer(INPUT_DELAYS)
+
+    # Offer to carry on if the app didn't close properly last time.
+    session = sj.replay(journal.path, script_buffer)
+    if session and "error" in session:
+        show_message(window, "-INFO-", 
+            f"\nThe last session's journal could not be read\nand was removed:\n{session['error']}",
+            "orange")
+    elif session and (script_buffer.rows or script_buffer.queue):
+        if sg.popup_yes_no(
+                "The last session did not finish.",
+                f"Carry on with {Path(session['script']).name}, "
+                f"{len(script_buffer.queue)} albums and {len(script_buffer.rows)} songs?",
+                no_titlebar=True, keep_on_top=True) == "Yes":
+            script_name = resume_session(window, session)
+            row_counter = len(script_buffer.rows)
         else:
-            song_number = get_song_inputs()[2]
-            song_row = create_song_row()
-            # Put the semicolon at end of string to complete the sql script.
-            song_row = '("' + '", "'.join(map(str, song_row)) + '");'
-            with open(script_name, "a") as file:
-                file.write(f"\n {song_row}")
-            show_message("-INFO-", f"The last row is: \n   {song_row}")
-            window["Copy script"].update(disabled=False)
-            show_script(script_name)
-
-    elif event in ("Copy script", "Alt-o"):
-        # Copy the text of the script to the clipboard.
-        script = sg.clipboard_set(values["-SCRIPT-"])
-        # Get the script from the clipboard.
-        script = sg.clipboard_get()
-        # Do a simple check of the script.
-        if check_sql_script(script) is False:
-            show_message("-INFO-",
-                "\nScript is missing unclosed quotes \nand/or \nclosing semicolon",
+            script_buffer.clear()
+            journal.discard()
+
+    # Connect in the background so the window shows right away.
+    if db.db_path.exists():
+        window.perform_long_operation(lambda: connect_worker(window), "-DB-THREAD-")
+
+    while True:  # event Loop
+        tracer.end()
+        # Show the timings at most once a second, so the panel doesn't slow things down.
+        if trace_window is not None and time.monotonic() - trace_shown > 1:
+            trace_window["-TRACE-"].update(tracer.summary_text())
+            trace_shown = time.monotonic()
+        event, values = window.read(timeout=debouncer.timeout())
+        tracer.begin(event)
+        if event in (sg.WIN_CLOSED, "Exit", "CTRL-X", "F4:115"):
+            break
+
+        # Typing is handled once it stops, then only for what was typed by the end.
+        if event == sg.TIMEOUT_EVENT:
+            for due in debouncer.due():
+                input_handlers[due](window, values)
+            continue
+        if debouncer.hold(event) or (sev.is_key_event(event) and event not in KEYS_HANDLED):
+            continue
+        # Anything else sees the inputs as they are now, so what's held back goes first.
+        for waiting in debouncer.flush():
+            input_handlers[waiting](window, values)
+        if event in input_handlers:
+            input_handlers[event](window, values)
+            continue
+
+        # sf.print_inputs(values)  # for testing, remove when done.
+
+        # Use enter or return key for any button that has focus.
+        if event in ("\r", QT_ENTER_KEY1, QT_ENTER_KEY2):  # Check for ENTER key.
+            # go find element with Focus
+            elem = window.find_element_with_focus()
+            if (elem is not None and elem.Type == sg.ELEM_TYPE_BUTTON):
+                # If it's a button element, click it
+                elem.Click()
+
+        # Radio button events:
+        if event == "-RB-CD-":
+            window["-SIDE-TEXT-"].update(
+                text_color="#3a3a3a",
+            )
+            window["-SIDE-"].update(
+                background_color="#3a3a3a",
+                text_color="#3a3a3a",
+            )
+            window["-CB-RESET-"].update(
+                visible=False,
+                disabled=True,
+            )
+
+        if event == "-RB-LP-":
+            window["-SIDE-TEXT-"].update(text_color="white")
+            window["-SIDE-"].update(background_color="#d4d6c8")
+            window["-SIDE-"].set_focus()
+            window["-CB-RESET-"].update(
+                visible=True, 
+                disabled=False
+            )
+
+        #  Checkbox events:
+        elif event == "-CB-RESET-":
+            window["-SONG-NUMBER-"].update(disabled=False)
+            window["-SONG-NUMBER-"].update(1)
+            window["-SONG-NUMBER-"].update(disabled=True)
+            window["-SIDE-"].set_focus()
+            window["-SIDE-"].update(select=True)
+            window["-CB-RESET-"].update(value=False)
+
+        # Button events:
+        if event in ["Create Script", "Alt-r"]:
+            # Catch blank inputs, uses named expression (walrus) assignment. This is not working now.
+            if empty_input := sf.check_inputs(required_inputs(values)):
+                sf.update_if_empty(window, empty_input)
+            else:
+                script_path = Path(values["-FOLDER-"])
+                script_folder = script_path.parent
+                script_name = script_path.name
+
+                cd(script_folder)
+                # Start the script with the necessary first lines, the file is
+                # kept open for the rows and synced at Last Song, Save and Commit.
+                script_buffer.clear()
+                script_buffer.open_file(script_name)
+                journal.inputs = {}
+                journal.start(script_name)
+                script_edited = False
+                show_message(window, "-INFO-", 
+                    f'"{script_name}"  script created.\n\nUpdate Album ID number and # of songs.\nEnter Song Title.',)
+                window["-ALBUM-ID-"].set_focus()
+                window["-ALBUM-ID-"].update(select=True, background_color="lightgrey")
+                window["Next Song"].update(disabled=False)
+                window["-SCRIPT-"].update(script_buffer.text())
+
+        if event in ("Next Song", "Next", "Alt-n"):
+            # Catch blank inputs, using named expression (walrus) assignment.
+            if empty_input := sf.check_inputs(required_inputs(values)):
+                sf.update_if_empty(window, empty_input)
+            else:
+                song_number = get_song_inputs(values)[2]
+                journal_inputs(window, values)
+                song_row = create_song_row(window, values)
+                hide_suggestions(window)
+                # Add the new row to the script, formatted with a comma at the end.
+                show_script_row(window, script_buffer.add_row(song_row))
+                check_song_row(window, song_row)
+                # Add 1 to the song_number.
+                song_number += 1
+                song_rows = int(values["-NUMBER-"])
+                row_counter += 1
+
+                window["-SONG-NUMBER-"].update(song_number)
+                window["-TITLE-"].set_focus()
+                window["-TITLE-"].update(select=True, background_color="lightgrey")
+
+                if row_counter == song_rows - 1:
+                    window["Next Song"].update(disabled=True)
+                    window["Last Song"].update(disabled=False)
+                    # window['Last Song'].set_focus()
+
+        elif event in ("Last Song", "Alt-l"):
+            # Catch empty inputs.
+            if empty_input := sf.check_inputs(required_inputs(values)):
+                sf.update_if_empty(window, empty_input)
+            else:
+                song_number = get_song_inputs(values)[2]
+                journal_inputs(window, values)
+                song_row = create_song_row(window, values)
+                hide_suggestions(window)
+                # Put the semicolon at end of the row to complete the sql script.
+                show_script_row(window, script_buffer.add_row(song_row, last=True))
+                script_buffer.checkpoint()
+                show_message(window, "-INFO-", f"The last row is: \n   {tuple(song_row)}")
+                check_song_row(window, song_row)
+                window["Copy script"].update(disabled=False)
+                # Carry on with another album, or copy and commit them all.
+                window["Next Album"].update(disabled=False)
+
+        elif event in ("Next Album", "Alt-a"):
+            start_next_album(window)
+            row_counter = 0
+
+        elif event in ("Undo", "Redo", "Edit Last Title", "Delete Last Row"):
+            # The rows can't be changed under a script that's been edited by hand.
+            if script_edited:
+                show_message(window, "-INFO-", 
+                    "The script was edited by hand,\nchange it in the script instead.", "orange")
+                continue
+            last_slot = script_buffer.rows.last_slot()
+            if event == "Undo":
+                changed = script_buffer.undo()
+            elif event == "Redo":
+                changed = script_buffer.redo()
+            elif last_slot is None:
+                changed = False
+            elif event == "Delete Last Row":
+                script_buffer.delete_row(last_slot)
+                changed = True
+            elif changed := bool(song_title := values["-TITLE-"].strip()):
+                last_row = script_buffer.rows.row(last_slot)
+                script_buffer.edit_row(last_slot, last_row._replace(song_title=song_title))
+            if changed:
+                show_rows_changed(window, values)
+                row_counter = len(script_buffer.rows)
+            else:
+                show_message(window, "-STATUS-", f"Nothing to {event.lower()}.", "yellow")
+
+        elif event in ("Copy script", "Alt-o"):
+            # Copy the text of the script to the clipboard, for pasting elsewhere.
+            # The commit uses the checked script, not the clipboard.
+            script = values["-SCRIPT-"]
+            sg.clipboard_set(script)
+            # Do a simple check of the script.
+            if se.check_sql_script(script) is False:
+                show_message(window, "-INFO-", 
+                    "\nScript is missing unclosed quotes \nand/or \nclosing semicolon",
+                    "orange")
+            # Then try it on the empty copy of the tables, if the database is connected.
+            elif schema_clone.is_loaded and (errors := schema_clone.dry_run(script)):
+                show_message(window, "-INFO-", 
+                    "Script would fail, nothing committed:\n" + se.format_errors(errors), "orange")
+            else:
+                checked_script = script
+                checked_hash = se.script_hash(script)
+                show_message(window, "-STATUS-", 
+                    "Script - checked and copied to clipboard, ready to commit.")
+                window["-INFO-"].update("", text_color="white")
+                window["Commit script"].update(disabled=False)
+                window["-CB-EDIT-"].update(visible=True)
+                window["-SCRIPT-"].update(disabled=True)
+
+        elif event in ["Commit script", "Alt-c"]:
+            # Only commit the script that was checked, if it changed since, check it again.
+            if se.script_hash(values["-SCRIPT-"]) != checked_hash:
+                window["Commit script"].update(disabled=True)
+                show_message(window, "-INFO-", 
+                    "\nThe script changed after it was checked.\nCopy script to check it again.",
+                    "orange")
+                continue
+            # Flush the script to its file before committing it.
+            save_script(script_name, checked_script, script_edited)
+            # Commit the typed rows of all the albums unless the script text was
+            # changed by hand. The commit runs in a worker thread so the window doesn't freeze.
+            albums = [] if script_edited else script_buffer.albums()
+            script = checked_script if not albums else ""
+            upsert = values["-CB-UPSERT-"]
+            commit_cancel.clear()
+            window["Commit script"].update(disabled=True)
+            window["Cancel commit"].update(visible=True)
+            show_message(window, "-STATUS-", "Committing script...")
+            window.perform_long_operation(
+                lambda: commit_worker(window, albums, script, upsert), "-COMMIT-THREAD-")
+
+        elif event == "Create song index":
+            if not db.db_path.exists():
+                show_message(window, "-INFO-", f"\nNo database at:\n{db.db_path}", "orange")
+            else:
+                show_message(window, "-STATUS-", "Creating the song index...")
+                window.perform_long_operation(
+                    lambda: song_index_worker(window), "-INDEX-THREAD-")
+
+        elif event == "-INDEX-DONE-":
+            show_message(window, "-STATUS-", 
+                f"Song index {values[event]} is ready, songs can be updated on commit.",
+                "light green")
+
+        elif event == "-INDEX-ERROR-":
+            show_message(window, "-STATUS-", "Could not create the song index.", "orange")
+            show_message(window, "-INFO-", f"\n{values[event]}", "orange")
+
+        elif event == "-DB-CONNECTED-":
+            show_message(window, "-STATUS-", 
+                f"Connected to database, {values[event]} songs indexed.")
+            read_page(window, catalog_pager.start(browse_album(values)))
+            window.perform_long_operation(lambda: title_index_worker(window), "-TITLES-THREAD-")
+
+        elif event == "-ALBUM-SEARCH-+DOWN":
+            if album_choices:
+                window["-ALBUM-LIST-"].update(set_to_index=0)
+                window["-ALBUM-LIST-"].set_focus()
+                pick_album(window, values, next(iter(album_choices.values())))
+
+        elif event == "-ALBUM-LIST-":
+            if values["-ALBUM-LIST-"] and (album := album_choices.get(values["-ALBUM-LIST-"][0])):
+                pick_album(window, values, album)
+
+        elif event in ("-ALBUM-LIST-+DONE", "-TITLE-+FOCUS"):
+            if album_choices:
+                album_choices.clear()
+                close_album_picker(window)
+                window["-TITLE-"].set_focus()
+
+        elif event == "-TITLES-INDEXED-":
+            if values[event]:
+                show_message(window, "-STATUS-", f"{values[event]} new titles indexed for suggestions.")
+
+        elif event == "-SUGGESTIONS-":
+            generation, titles = values[event]
+            # Only the suggestions for what's in the title now.
+            if generation == title_index.generation:
+                window["-SUGGEST-"].update(values=titles, visible=bool(titles))
+
+        elif event == "-TITLE-+DOWN":
+            if window["-SUGGEST-"].Values:
+                window["-SUGGEST-"].update(set_to_index=0)
+                window["-SUGGEST-"].set_focus()
+                window["-TITLE-"].update(window["-SUGGEST-"].Values[0])
+
+        elif event == "-SUGGEST-":
+            if values["-SUGGEST-"]:
+                # Enter then adds the song with the title chosen.
+                window["-TITLE-"].update(values["-SUGGEST-"][0])
+
+        elif event == "-BROWSE-ALBUM-":
+            read_page(window, catalog_pager.start(browse_album(values)) if db.is_open else None)
+
+        elif event in ("-BROWSE-TOP-", "-BROWSE-END-"):
+            if db.is_open:
+                read_page(window, catalog_pager.start(
+                    browse_album(values), from_end=event == "-BROWSE-END-"))
+
+        elif event == "-BROWSE-SCROLL-":
+            first, last = values[event]
+            query = catalog_pager.next_query() if last > 0.9 else None
+            if query is None and first < 0.1:
+                query = catalog_pager.previous_query()
+            read_page(window, query)
+
+        elif event == "-BROWSE-PAGE-":
+            show_page(window, *values[event])
+
+        elif event == "-BROWSE-ERROR-":
+            catalog_pager.pending = None
+            window["-BROWSE-STATUS-"].update("Could not read the catalog.")
+            show_message(window, "-INFO-", f"\nDatabase error:\n{values[event]}", "orange")
+
+        elif event in ("Scan folder", "Import tracklist"):
+            if script_buffer.writer is None or script_buffer.closed or scan_builder:
+                show_message(window, "-INFO-", 
+                    "\nCreate the script, or start the next album,\nbefore adding songs.",
+                    "orange")
+                continue
+            if not values["-ALBUM-ID-"].strip().isdigit():
+                show_message(window, "-INFO-", "\nEnter the Album ID first.", "yellow")
+                continue
+            if event == "Scan folder":
+                source = sg.popup_get_folder("Album folder to scan:", 
+                    no_titlebar=True, keep_on_top=True)
+                tracks_to_read = source and sscan.scan_folder(Path(source))
+            else:
+                source = sg.popup_get_file("Cue sheet or tracklist to import:", 
+                    file_types=(("Cue sheets and tracklists", "*.cue *.txt"), ("All files", "*.*")),
+                    no_titlebar=True, keep_on_top=True)
+                tracks_to_read = source and stl.iter_tracklist(Path(source))
+            if source:
+                scan_builder = sscan.RowBuilder(values["-ALBUM-ID-"])
+                scan_slots = []
+                window["Next Song"].update(disabled=True)
+                window["Last Song"].update(disabled=True)
+                show_message(window, "-STATUS-", f"Reading {source}...")
+                window.perform_long_operation(
+                    lambda: scan_worker(window, tracks_to_read), "-SCAN-THREAD-")
+
+        elif event == "-SCAN-TRACKS-":
+            scan_builder = add_scanned_tracks(window, scan_builder, values[event], scan_slots)
+
+        elif event == "-SCAN-DONE-":
+            count, elapsed = values[event]
+            finish_scan(window, scan_builder)
+            stopped_at = scan_builder.stopped_at
+            scan_builder = None
+            row_counter = len(script_buffer.rows)
+            show_message(window, "-STATUS-", 
+                f"Read {count} songs in {elapsed:.1f} s, {len(script_buffer.queue) + 1} albums.",
+                "light green")
+            if stopped_at is not None:
+                show_message(window, "-INFO-", 
+                    f'\nStopped before "{stopped_at}", it has no Album ID.\n'
+                    "Give it an \"album 123\" line, or import it\non its own with its Album ID.",
+                    "orange")
+            else:
+                show_message(window, "-INFO-", 
+                    "\nCheck the titles, then copy and commit\nor carry on with the next album.")
+
+        elif event == "-SCAN-ERROR-":
+            tracks, error = values[event]
+            scan_builder = add_scanned_tracks(window, scan_builder, tracks, scan_slots)
+            finish_scan(window, scan_builder, last=False)
+            scan_builder = None
+            row_counter = len(script_buffer.rows)
+            show_message(window, "-STATUS-", "Scan stopped, the songs read so far were added.", 
                 "orange")
-        else:
-            show_message("-STATUS-", 
-                "Script - checked and copied to clipboard, ready to commit.")
-            window["-INFO-"].update("", text_color="white")
-            window["Commit script"].update(disabled=False)
-            window["-CB-EDIT-"].update(visible=True)
-            window["-SCRIPT-"].update(disabled=True)
-
-    elif event in ["Commit script", "Alt-c"]:
-        script = sg.clipboard_get()
-        with chdir(path_to_db):
-            execute_sql_script("db.sqlite3", script)
-            show_message("-STATUS-", "Script committed to database.")
-
-    elif event in ("Clear inputs", "Clear", "Alt-e"):
-        values.clear()
-        row_counter = 0
-        for key in keys_to_clear:
-            window[key].update("")
-        window["Copy script"].update(disabled=True)
-        window["Commit script"].update(disabled=True)
-        window["Next Song"].update(disabled=True)
-        window["-SONG-NUMBER-"].update(1)
-        window["-SIDE-"].update("A")
-        window["-CB-EDIT-"].update(visible=False)
-        window["-SCRIPT-"].update(value=".")
-        window['-STATUS-'].update("")
-        
-    # Menu events:
-    elif event.startswith("Open") or event == "CTRL-O":
-        script_name = Path(sg.popup_get_file("file to open", no_window=True))
-        show_message("-INFO-", f"File opened: \n{script_name}")
-        show_script(script_name)
-        print(script_name)
-        window["Copy script"].update(disabled=False)
-
-    elif event in ("Edit Script", "-CB-EDIT-"):
-        allow_edits()
-
-    elif event.startswith("Save") or event == "CTRL-S":
-        # if check_sql_script(script) == False:
-        if check_sql_script(script) is False:
-            show_message("-INFO-", 
-                "\nScript is missing unclosed quotes \nand/or \nclosing semicolon",
-                text_color="orange",)
-        else:
-            text = values["-SCRIPT-"]
-            with open(script_name, "w") as file:
-                file.write(text)
-            show_message("-STATUS-", f"\tScript saved as: {script_name}.", 
-                    text_color="light green")
-
-    elif event in ("Delete",):
-        with suppress(NameError):
-            script_name
-
-            file_to_delete = Path(script_name)
-            if Path(file_to_delete).exists():
-                sf.delete_file(file_to_delete)
+            show_message(window, "-INFO-", f"\nCould not read the songs:\n{error}", "orange")
+
+        elif event == "-DB-ERROR-":
+            show_message(window, "-STATUS-", "Could not connect to database.", "orange")
+            show_message(window, "-INFO-", f"\nDatabase error:\n{values[event]}", "orange")
+
+        elif event == "Cancel commit":
+            commit_cancel.set()
+            db.interrupt()
+            show_message(window, "-STATUS-", "Cancelling commit...", "yellow")
+
+        elif event == "-COMMIT-PROGRESS-":
+            rows_written, elapsed = values[event]
+            show_message(window, "-STATUS-", 
+                f"Committing... {rows_written} rows written, {elapsed:.1f} s")
+
+        elif event == "-COMMIT-DONE-":
+            rows_written, elapsed, report, counts = values[event]
+            commit_finished(window)
+            if counts:
+                show_message(window, "-STATUS-", 
+                    f"{counts.inserted} songs added, {counts.updated} updated, "
+                    f"{counts.unchanged} unchanged in {elapsed:.2f} s.")
+            else:
+                show_message(window, "-STATUS-", 
+                    f"{rows_written} rows committed to database in {elapsed:.2f} s.")
+            if report:
+                show_message(window, "-INFO-", se.format_report(report))
+            # Updated titles need the page read again, new songs come after the last page.
+            read_page(window,
+                catalog_pager.reload() if counts and counts.updated else catalog_pager.more_query())
+
+        elif event == "-COPIES-DONE-":
+            lines = values[event]
+            trouble = any(not line.endswith("matches.") for line in lines)
+            show_message(window, "-INFO-", "\nReplicas:\n" + "\n".join(lines),
+                "orange" if trouble else "white")
+
+        elif event == "-COMMIT-CANCELLED-":
+            elapsed, rows_committed = values[event]
+            commit_finished(window)
+            show_message(window, "-STATUS-", 
+                f"Commit cancelled after {elapsed:.1f} s, the batch it was in was rolled back, "
+                f"{rows_committed} rows were already committed.",
+                "yellow")
+
+        elif event == "-COMMIT-ERROR-":
+            commit_finished(window)
+            show_message(window, "-STATUS-", "Commit failed, nothing was committed.", "orange")
+            show_message(window, "-INFO-", f"\nDatabase error:\n{values[event]}", "orange")
+
+        elif event in ("Clear inputs", "Clear", "Alt-e"):
+            values.clear()
+            row_counter = 0
+            album_choices.clear()
+            close_album_picker(window)
+            script_buffer.clear()
+            journal.discard()
+            script_edited = False
+            for key in keys_to_clear:
+                window[key].update("")
+            window["Copy script"].update(disabled=True)
+            window["Commit script"].update(disabled=True)
+            window["Next Song"].update(disabled=True)
+            window["Next Album"].update(disabled=True)
+            window["-SONG-NUMBER-"].update(1)
+            window["-SIDE-"].update("A")
+            window["-CB-EDIT-"].update(visible=False)
+            window["-SCRIPT-"].update(value=".")
+            window['-STATUS-'].update("")
+
+        # Menu events:
+        elif event.startswith("Open") or event == "CTRL-O":
+            script_name = Path(sg.popup_get_file("file to open", no_window=True))
+            # A script that never got its last row, ie. the app closed
+            # in the middle of an album, can be carried on with.
+            albums, closed = se.parse_script(sf.open_text_file(script_name))
+            if any(albums) and not closed and sg.popup_yes_no(
+                    f"{script_name.name} was not finished.",
+                    f"Recover its {len(albums)} albums and carry on?",
+                    no_titlebar=True, keep_on_top=True) == "Yes":
+                recover_script(window, script_name, albums)
+                row_counter = len(albums[-1])
+                script_edited = False
+            else:
+                # The opened script is committed as text, not from the rows.
+                script_buffer.clear()
+                journal.discard()
+                script_edited = True
+                show_message(window, "-INFO-", f"File opened: \n{script_name}")
+                show_script(window, script_name)
+                print(script_name)
+                window["Copy script"].update(disabled=False)
+
+        elif event in ("Edit Script", "-CB-EDIT-"):
+            script_edited = True
+            allow_edits(window)
+
+        elif event == "-SCRIPT-+KEY":
+            if script_edited:
+                revalidate_script(window)
+
+        elif event.startswith("Save") or event == "CTRL-S":
+            # if se.check_sql_script(script) == False:
+            if se.check_sql_script(values["-SCRIPT-"]) is False:
+                show_message(window, "-INFO-", 
+                    "\nScript is missing unclosed quotes \nand/or \nclosing semicolon",
+                    "orange",)
             else:
-                sg.Popup(
-                    "Nothing to delete",
-                    text_color="yellow",
-                    font=("Calibri", 14),
+                save_script(script_name, values["-SCRIPT-"], script_edited)
+                show_message(window, "-STATUS-", f"\tScript saved as: {script_name}.", 
+                        text_color="light green")
+
+        elif event in ("Delete",):
+            with suppress(NameError):
+                script_name
+                script_buffer.close_file()
+                journal.discard()
+
+                file_to_delete = Path(script_name)
+                if Path(file_to_delete).exists():
+                    sf.delete_file(file_to_delete)
+                else:
+                    sg.Popup(
+                        "Nothing to delete",
+                        text_color="yellow",
+                        font=("Calibri", 14),
+                        no_titlebar=True,
+                        keep_on_top=True,
+                        relative_location=(0, 200),
+                    )
+                    show_message(window, "-INFO-", "Nothing to delete", text_color="dark orange" )
+
+                if deleted := sf.confirm_file_does_not_exist(file_to_delete):
+                    show_message(window, "-INFO-", f'\nThe file  "{script_name}"  was deleted',
+                        text_color="dark orange",)
+                else:
+                    show_message(window, "-INFO-", f'\n"{script_name}"  not deleted')
+
+        # Show a popup with some information about the app.
+        if event in ("About...", "F2:113"):
+            with chdir(path_to_app):
+                about = sf.open_text_file(Path("Resources\\about.txt"))
+                window.disappear()
+                sg.popup(
+                    "About SQL Scripter",
+                    "Version 1.0",
+                    "PySimpleGUI Version:",
+                    sg.version,
+                    about,
                     no_titlebar=True,
-                    keep_on_top=True,
-                    relative_location=(0, 200),
+                    image=title_icon,
                 )
-                show_message("-INFO-", "Nothing to delete", text_color="dark orange" )
-
-            if deleted := sf.confirm_file_does_not_exist(file_to_delete):
-                show_message("-INFO-", f'\nThe file  "{script_name}"  was deleted',
-                    text_color="dark orange",)
-            else:
-                show_message("-INFO-", f'\n"{script_name}"  not deleted')
-
-    # Show a popup with some information about the app.
-    if event in ("About...", "F2:113"):
-        with chdir(path_to_app):
-            about = sf.open_text_file(Path("Resources\\about.txt"))
-            window.disappear()
-            sg.popup(
-                "About SQL Scripter",
-                "Version 1.0",
-                "PySimpleGUI Version:",
-                sg.version,
-                about,
-                no_titlebar=True,
-                image=title_icon,
-            )
-            window.reappear()
-
-    # # Use the Help menu item or press F1.
-    if event in ('Help', 'F1:112'):
-        with chdir(path_to_app):
-            print(f'Help folder is: {path_to_app}')
-            help_file = Path('Resources\\help.html')
-            help = sf.open_file_in_browser(help_file)
-
-window.close()
+                window.reappear()
+
+        # # Use the Help menu item or press F1.
+        if event in ('Help', 'F1:112'):
+            with chdir(path_to_app):
+                print(f'Help folder is: {path_to_app}')
+                help_file = Path('Resources\\help.html')
+                help = sf.open_file_in_browser(help_file)
+
+    script_buffer.close_file()
+    # Keep the journal only if an album was left part way through.
+    if script_buffer.rows and not script_buffer.closed:
+        journal.close()
+    else:
+        journal.discard()
+    tracer.close()
+    if trace_window is not None:
+        trace_window.close()
+    # Roll back a commit that is still running before closing the connection.
+    commit_cancel.set()
+    db.interrupt()
+    db.close()
+    catalog_pager.close()
+    title_index.close()
+    window.close()
+
+
+if __name__ == "__main__":
+    # The folder scan uses worker processes, this is needed when it's made into an exe.
+    multiprocessing.freeze_support()
+    main()